@@ -2,15 +2,205 @@ import json
 import telebot
 from telebot import types
 from config.config import TELEGRAM_TOKEN, DATABASE_URL
-from gigachat_promt import parse_user_query_with_giga, generate_analysis_with_giga, response_with_giga
+from gigachat_promt import parse_user_query_with_giga, generate_analysis_with_giga, response_with_giga, giga_stats
 from prompts import PARSE_PROMPT
-from analysis import plot_price_chart, compute_stats, query_prices, format_stats, get_available_companies, plot_volatility_chart, plot_returns_histogram
+from comparison import compute_comparison, format_comparison
+from summaries import period_key, period_label, summarize, format_leaderboard
+from analysis import query_leaderboard, query_stats, query_prices, format_stats, get_available_companies, create_db_engine, pool_stats, data_version, CHART_COLUMNS, init_price_backend, reload_price_store, get_company_aliases
+from frame_cache import FrameCache, make_key
+from chart_cache import ChartCache, chart_key, CHART_STYLE_VERSION
+from chart_render import render_chart, render_signature
+from meme_index import MemeIndex
+from dispatcher import ChatDispatcher, RenderPool
+from query_parser import AIMS, QueryParser, YEAR
+from change_listener import listen_for_changes
+from session_store import create_session_store
+from metrics import metrics
 from sqlalchemy import text
-import os
-import random
+import signal
+
+# Обработчики выполняет dispatcher, поэтому собственные потоки telebot не нужны
+bot = telebot.TeleBot(TELEGRAM_TOKEN, threaded=False)
+# Время ответов Telegram — отдельный этап в метриках
+metrics.instrument(bot, ("send_message", "send_photo", "send_chat_action"), "telegram_send")
+engine = create_db_engine(DATABASE_URL)
+frame_cache = FrameCache()
+meme_index = MemeIndex()
+sessions = create_session_store(engine)
+init_price_backend(engine)
+chart_cache = ChartCache(data_version=data_version(engine))
+render_pool = RenderPool()
+dispatcher = ChatDispatcher()
+metrics.register_gauges(lambda: {f"dispatcher_{k}": v for k, v in dispatcher.stats().items()})
+metrics.register_gauges(lambda: {f"db_pool_{k}": v for k, v in pool_stats(engine).items()})
+metrics.register_gauges(lambda: {f"frame_cache_{k}": v for k, v in frame_cache.stats().items()})
+metrics.register_gauges(lambda: {f"chart_cache_{k}": v for k, v in chart_cache.stats().items()})
+metrics.register_gauges(giga_stats)
+metrics.register_gauges(lambda: {f"query_parser_{k}": v for k, v in query_parser.stats().items()} if query_parser else {})
+metrics.register_gauges(lambda: {f"meme_{k}": v for k, v in meme_index.stats().items()})
+query_parser = None
+
+
+def build_query_parser():
+    global query_parser
+    try:
+        query_parser = QueryParser(get_company_aliases(engine))
+    except Exception as e:
+        # Без словаря все запросы разбирает GigaChat
+        print(f"Не удалось построить быстрый разбор запросов: {e}")
+
+
+build_query_parser()
+
+
+def get_context(chat_id):
+    return sessions.get(chat_id)
+
+
+def set_context(chat_id, ctx):
+    sessions.set(chat_id, ctx)
+
+
+def reload_data(*_):
+    # Вызывать после повторного запуска loader.py
+    reload_price_store(engine)
+    frame_cache.invalidate()
+    chart_cache.invalidate()
+    chart_cache.set_data_version(data_version(engine))
+    meme_index.reload()
+    build_query_parser()
+
+
+def on_data_changed(change):
+    # Уведомление от loader.py: сбрасываем кэши только по затронутым тикерам
+    tickers = change.get("tickers")
+    reload_price_store(engine)
+    frame_cache.invalidate(tickers)
+    chart_cache.invalidate(tickers)
+    chart_cache.set_data_version(data_version(engine))
+    # Словарь компаний нужно строить заново, только если появились новые тикеры
+    parser = query_parser
+    if tickers is None or parser is None or not {t.upper() for t in tickers} <= parser.tickers.keys():
+        build_query_parser()
+
+
+if hasattr(signal, "SIGHUP"):
+    signal.signal(signal.SIGHUP, reload_data)
+
+
+def load_prices(tickers, start_date, end_date):
+    # Один и тот же запрос из текста и из кнопок берём из кэша
+    def query():
+        with metrics.span("query_prices"):
+            return query_prices(engine, tickers, start_date=start_date, end_date=end_date, columns=CHART_COLUMNS)
+
+    with metrics.span("load_prices"):
+        return frame_cache.get_or_load(make_key(tickers, start_date, end_date), query)
+
+
+def load_stats(tickers, start_date, end_date):
+    loader = lambda: load_prices(tickers, start_date, end_date)
+    with metrics.span("compute_stats"):
+        return query_stats(engine, tickers, start_date, end_date, loader=loader)
+
+
+# -------------------------------------------------------
+#  Графики
+# -------------------------------------------------------
+
+VOLATILITY_WINDOW = 10
+RETURNS_BINS = 30
+
+# кнопка -> (тип графика, параметры)
+CHART_TYPES = {
+    "graph_price": ("price", {}),
+    "graph_return": ("returns", {"bins": RETURNS_BINS}),
+    "graph_volatility": ("volatility", {"window": VOLATILITY_WINDOW}),
+    "graph_correlation": ("correlation", {}),
+}
+# Цели в метриках: разбор запроса, кнопки графиков и действий; прочее — "other"
+metrics.set_known_aims([name for name, _ in AIMS] + list(CHART_TYPES) + ["want_graph", "want_stats", "want_analysis"])
+
+
+def send_chart(chat_id, kind, ctx):
+    tickers, start_date, end_date = ctx["tickers"], ctx["start_date"], ctx["end_date"]
+    chart, params = CHART_TYPES[kind]
+    key = chart_key(kind, tickers, start_date, end_date, params, style=f"{CHART_STYLE_VERSION}:{render_signature()}")
+
+    # Такой график уже отправляли — достаточно file_id
+    file_id = chart_cache.get_file_id(key)
+    if file_id:
+        try:
+            bot.send_photo(chat_id, file_id)
+            return
+        except telebot.apihelper.ApiTelegramException:
+            chart_cache.forget_file_id(key)
+
+    img = chart_cache.get_bytes(key)
+    if img is None:
+        df = load_prices(tickers, start_date, end_date)
+        with metrics.span("render"):
+            img = render_pool.run(render_chart, chart, df, **params)
+        chart_cache.put_bytes(key, img, tickers)
+
+    sent = bot.send_photo(chat_id, img)
+    if sent and sent.photo:
+        chart_cache.set_file_id(key, sent.photo[-1].file_id, tickers)
+
+
+# -------------------------------------------------------
+#  Мемы
+# -------------------------------------------------------
+
+def send_random_meme(chat_id):
+    meme = meme_index.next(chat_id)
+    if meme is None:
+        bot.send_message(chat_id, "Мемы пока закончились 😅")
+        return
+
+    # Уже загружали — отправляем по file_id, без файла
+    if meme.file_id:
+        try:
+            bot.send_photo(chat_id, meme.file_id)
+            return
+        except telebot.apihelper.ApiTelegramException:
+            meme_index.forget_file_id(meme)
+
+    try:
+        sent = bot.send_photo(chat_id, meme.data)
+        if sent and sent.photo:
+            meme_index.set_file_id(meme, sent.photo[-1].file_id)
+    except Exception as e:
+        bot.send_message(chat_id, "Не удалось отправить мем 😅 Попробуйте ещё раз!")
+        print(f"Ошибка отправки мема: {e}")
+
+
+# -------------------------------------------------------
+#  Рейтинги
+# -------------------------------------------------------
+
+def send_leaderboard(chat_id, tickers, start_date, end_date, label=None):
+    # Без дат — весь год
+    start_date = start_date or f"{YEAR}-01-01"
+    end_date = end_date or f"{YEAR}-12-31"
+    key = period_key(start_date, end_date)
+
+    summary = None
+    if key is not None:
+        try:
+            with metrics.span("leaderboard"):
+                summary = query_leaderboard(engine, key, tickers)
+        except Exception as e:
+            # Сводки ещё не построены (loader.py --summaries-only) — считаем по ценам
+            print(f"Не удалось прочитать сводки: {e}")
+    if summary is None or summary.empty:
+        df = load_prices(tickers, start_date, end_date)
+        with metrics.span("summarize"):
+            summary = summarize(df)
+
+    label = period_label(key) or label or f"{start_date} — {end_date}"
+    bot.send_message(chat_id, format_leaderboard(summary, label))
 
-bot = telebot.TeleBot(TELEGRAM_TOKEN)
-user_context = {}
 
 # -------------------------------------------------------
 #  Кнопки
@@ -53,6 +243,7 @@ def send_error(chat_id, text):
 # -------------------------------------------------------
 
 @bot.message_handler(commands=['start', 'help'])
+@dispatcher.per_chat(lambda message: message.chat.id)
 def send_welcome(message):
 
     text = (f"Привет, {message.from_user.first_name}!👋\n\n"
@@ -68,16 +259,20 @@ def send_welcome(message):
             "• Покажи график Apple за март\n"
             "• Статистика NVDA и MSFT за апрель\n"
             "• Сделай анализ Google за первое полугодие\n"
+            "• Сравни NVDA и MSFT за второй квартал\n"
+            "• Какие акции выросли сильнее всего в марте\n"
     )
     bot.send_message(message.chat.id, text, reply_markup=main_menu())
 
 @bot.message_handler(func=lambda message: message.text and message.text.strip().lower().startswith('привет'))
+@dispatcher.per_chat(lambda message: message.chat.id)
 def handle_greeting(message):
-    send_welcome(message)
+    send_welcome.__wrapped__(message)
 
 @bot.message_handler(func=lambda m: True, content_types=['text'])
+@dispatcher.per_chat(lambda message: message.chat.id)
+@metrics.traced("text")
 def handle_text(message):
-    global user_context
     chat_id = message.chat.id
     user_ms = message.text.strip()
     
@@ -92,20 +287,24 @@ def handle_text(message):
         return
     
     def send_help_message(chat_id):
-        companies = get_available_companies(DATABASE_URL)
+        companies = get_available_companies(engine)
         companies_list = "\n".join(f"• {ticker}" for ticker in companies)
 
         help_text = (
             "Вот что я умею:\n"
             "📊 • Строить графики цен акций\n"
             "🧮 • Считать статистику (среднее, максимум, волатильность и т.д.)\n"
-            "💬 • Давать текстовый анализ на основе данных за 2024 год\n\n"
+            "💬 • Давать текстовый анализ на основе данных за 2024 год\n"
+            "⚖️ • Сравнивать компании: корреляция, бета, просадка, коэффициент Шарпа\n"
+            "🏆 • Показывать лидеров и аутсайдеров за месяц, квартал, полугодие или год\n\n"
             "🏢 Доступны данные по следующим компаниям:\n"
             f"{companies_list}\n\n"
             "📋 Примеры запросов:\n"
             "• График AAPL за март\n"
             "• Статистика NVDA и MSFT за апрель\n"
-            "• Анализ Google за первое полугодие\n\n"
+            "• Анализ Google за первое полугодие\n"
+            "• Сравни Apple и Microsoft за год\n"
+            "• Топ за второй квартал\n\n"
             "Жду ваш запрос! 🚀"
         )
         bot.send_message(chat_id, help_text, reply_markup=main_menu())    
@@ -114,58 +313,58 @@ def handle_text(message):
         send_help_message(chat_id)
         return
     
-    def send_random_meme(chat_id):
-        meme_dir = "memes"
-        meme_files = [f for f in os.listdir(meme_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        random_meme = random.choice(meme_files)
-        meme_path = os.path.join(meme_dir, random_meme)
-
-        try:
-            with open(meme_path, 'rb') as photo:
-                bot.send_photo(chat_id, photo)
-        except Exception as e:
-            bot.send_message(chat_id, "Не удалось отправить мем 😅 Попробуйте ещё раз!")
-            print(f"Ошибка отправки мема: {e}")
-
     if user_ms == "🎭 Мем":
         send_random_meme(chat_id)
         return
 
     bot.send_chat_action(chat_id, 'typing')
 
-    try:
+    # Типовые запросы разбираем локально, остальные — через GigaChat
+    parser = query_parser
+    with metrics.span("parse_local"):
+        parsed = parser.parse(user_ms) if parser is not None else None
 
-        giga_resp = parse_user_query_with_giga(PARSE_PROMPT, user_ms)
+    if parsed is None:
         try:
-            parsed = json.loads(giga_resp)
-        except Exception:
-            cleaned = giga_resp.strip().strip('`')
-            parsed = json.loads(cleaned)
-    except Exception as e:
-        bot.send_message(chat_id, f"К сожалению, я не смог понять запрос 🤔\nПопробуйте еще раз!")
-        return
+
+            with metrics.span("parse_giga"):
+                giga_resp = parse_user_query_with_giga(PARSE_PROMPT, user_ms)
+            try:
+                parsed = json.loads(giga_resp)
+            except Exception:
+                cleaned = giga_resp.strip().strip('`')
+                parsed = json.loads(cleaned)
+        except Exception as e:
+            bot.send_message(chat_id, f"К сожалению, я не смог понять запрос 🤔\nПопробуйте еще раз!")
+            return
     
     aim = parsed.get('Aim')
+    metrics.set_aim(aim)
     ticker = parsed.get('ticker')
     start_date = parsed.get('start_date')
     end_date = parsed.get('end_date')
 
-    user_context[chat_id] = {
+    set_context(chat_id, {
         "tickers": ticker,
         "start_date": start_date,
         "end_date": end_date
-    }
+    })
+
+    if aim == 'топ':
+        send_leaderboard(chat_id, ticker, start_date, end_date, parsed.get('period'))
+        return
 
     if not ticker:
         try:
-            reply = response_with_giga(f"Пользователь спросил: {user_ms}") #но не указан тикер акции.
+            with metrics.span("reply_giga"):
+                reply = response_with_giga(f"Пользователь спросил: {user_ms}") #но не указан тикер акции.
             bot.send_message(chat_id, reply)
         except Exception:
             send_error(chat_id, "Не удалось определить компанию 🏷️")
         return
 
     try:
-        df = query_prices(DATABASE_URL, ticker, start_date=start_date, end_date=end_date)
+        df = load_prices(ticker, start_date, end_date)
     except:
         bot.send_message(chat_id, f"К сожалению произошла ошибка, повторите попытку еще раз ((")
         return
@@ -181,16 +380,26 @@ def handle_text(message):
         return 
     
     elif aim == 'статистика':
-        stats = compute_stats(df)
+        stats = load_stats(ticker, start_date, end_date)
         bot.send_message(chat_id, format_stats(stats), parse_mode='html')
         # bot.send_message(chat_id, generate_analysis_with_giga(stats))
         bot.send_message(chat_id, "Хотите дополнительно?", reply_markup=inline_action_buttons())
 
     elif aim == 'анализ':
-        stats = compute_stats(df)
+        stats = load_stats(ticker, start_date, end_date)
         bot.send_message(chat_id, 'Краткая аналитическая сводка: \n')
-        bot.send_message(chat_id, generate_analysis_with_giga(stats))
+        with metrics.span("analysis_giga"):
+            analysis = generate_analysis_with_giga(stats)
+        bot.send_message(chat_id, analysis)
         bot.send_message(chat_id, "Что ещё показать?", reply_markup=inline_action_buttons())
+
+    elif aim == 'сравнение':
+        with metrics.span("compute_comparison"):
+            comparison = compute_comparison(df)
+        bot.send_message(chat_id, format_comparison(comparison))
+        if len(comparison["tickers"]) > 1:
+            send_chart(chat_id, "graph_correlation", get_context(chat_id))
+        bot.send_message(chat_id, "Хотите дополнительно?", reply_markup=inline_action_buttons())
     
     else:
         bot.send_message(
@@ -204,30 +413,19 @@ def handle_text(message):
 # -------------------------------------------------------
 
 @bot.callback_query_handler(func=lambda c: True)
+@dispatcher.per_chat(lambda call: call.message.chat.id)
+@metrics.traced("callback")
 def callback_handler(call):
-    global user_context
     chat_id = call.message.chat.id
-    ctx = user_context.get(chat_id)
+    metrics.set_aim(call.data)
+    ctx = get_context(chat_id)
 
     if ctx is None:
         bot.send_message(chat_id, "Сначала сделайте запрос: например «График AAPL за апрель»")
         return
     
-    if call.data in ["graph_price", "graph_return", "graph_volatility"]:
-        df = query_prices(
-            DATABASE_URL,
-            ctx["tickers"],
-            start_date=ctx["start_date"],
-            end_date=ctx["end_date"]
-        )
-        if call.data == "graph_price":
-            img_buf = plot_price_chart(df)
-        elif call.data == "graph_return":
-            img_buf = plot_returns_histogram(df)
-        elif call.data == "graph_volatility":
-            img_buf = plot_volatility_chart(df)
-
-        bot.send_photo(chat_id, img_buf)
+    if call.data in CHART_TYPES:
+        send_chart(chat_id, call.data, ctx)
         bot.send_message(chat_id, "Хотите ещё что-то?", reply_markup=inline_action_buttons())
         return
     
@@ -237,26 +435,19 @@ def callback_handler(call):
         return
 
     elif call.data == "want_stats":
-        df = query_prices(
-            DATABASE_URL,
-            ctx["tickers"],
-            start_date=ctx["start_date"],
-            end_date=ctx["end_date"]
-        )
-        stats = compute_stats(df)
+        stats = load_stats(ctx["tickers"], ctx["start_date"], ctx["end_date"])
         bot.send_message(chat_id, format_stats(stats), parse_mode='html')
         bot.send_message(chat_id, "Хотите ещё что-то?", reply_markup=inline_action_buttons())
 
     elif call.data == "want_analysis":
-        df = query_prices(
-            DATABASE_URL,
-            ctx["tickers"],
-            start_date=ctx["start_date"],
-            end_date=ctx["end_date"]
-        )
-        stats = compute_stats(df)
-        bot.send_message(chat_id, generate_analysis_with_giga(stats))
+        stats = load_stats(ctx["tickers"], ctx["start_date"], ctx["end_date"])
+        with metrics.span("analysis_giga"):
+            analysis = generate_analysis_with_giga(stats)
+        bot.send_message(chat_id, analysis)
         bot.send_message(chat_id, "Хотите ещё что-то?", reply_markup=inline_action_buttons())
 
 
-bot.polling(none_stop=True)
\ No newline at end of file
+if __name__ == "__main__":
+    metrics.start()
+    listen_for_changes(engine, on_data_changed)
+    bot.polling(none_stop=True)
\ No newline at end of file
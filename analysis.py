@@ -1,62 +1,341 @@
 # analytics.py
 import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, create_engine, event, text
+from sqlalchemy.engine import make_url
+
+from price_store import PriceStore
+from snapshot import SNAPSHOT_DIR, SNAPSHOT_FORMAT, SnapshotStore
+from summaries import SUMMARY_COLUMNS, SUMMARY_TABLE
 
 plt.switch_backend('Agg') 
 
+# -------------------------------------------------------
+#  Пул соединений с БД
+# -------------------------------------------------------
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False", "")
+
+_engines = {}
+_pool_stats = {}
+_pool_locks = {}  # счётчики пула обновляются из потоков обработчиков
+_engines_lock = threading.Lock()
+
+
+def _pool_kwargs(database_url):
+    url = make_url(database_url)
+    kwargs = {"pool_pre_ping": DB_POOL_PRE_PING}
+    # SQLite в памяти работает через SingletonThreadPool без размеров пула
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return kwargs
+    kwargs.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return kwargs
+
+
 def create_db_engine(database_url):
-    return create_engine(database_url, future=True)
+    # Один engine (и один пул) на процесс для каждого URL
+    with _engines_lock:
+        engine = _engines.get(database_url)
+        if engine is None:
+            engine = create_engine(database_url, future=True, **_pool_kwargs(database_url))
+            stats = {"connects": 0, "checkouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+            lock = threading.Lock()
+
+            def on_connect(dbapi_conn, conn_record, stats=stats, lock=lock):
+                with lock:
+                    stats["connects"] += 1
+
+            event.listen(engine, "connect", on_connect)
+            _engines[database_url] = engine
+            _pool_stats[engine] = stats
+            _pool_locks[engine] = lock
+        return engine
+
+
+def _resolve_engine(engine):
+    # Для совместимости принимаем и строку DATABASE_URL
+    if isinstance(engine, str):
+        return create_db_engine(engine)
+    return engine
+
+
+@contextmanager
+def _connect(engine):
+    engine = _resolve_engine(engine)
+    started = time.perf_counter()
+    conn = engine.connect()
+    waited = time.perf_counter() - started
+    stats = _pool_stats.get(engine)
+    if stats is not None:
+        with _pool_locks[engine]:
+            stats["checkouts"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def pool_stats(engine):
+    engine = _resolve_engine(engine)
+    pool = engine.pool
+    lock = _pool_locks.get(engine)
+    if lock is None:
+        stats = {}
+    else:
+        with lock:
+            stats = dict(_pool_stats[engine])
+    checkouts = stats.get("checkouts", 0)
+    stats["avg_wait"] = stats.get("wait_total", 0.0) / checkouts if checkouts else 0.0
+    stats["pool"] = pool.status()
+    for name in ("size", "checkedout", "checkedin", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
 
 def get_available_companies(engine):
     query = text("SELECT DISTINCT \"Ticker\" FROM stock_data ORDER BY \"Ticker\";")
-    df = pd.read_sql(query, engine)
+    with _connect(engine) as conn:
+        df = pd.read_sql(query, conn)
     tickers = df['Ticker'].tolist()
     return tickers
 
 
-def query_prices(engine, tickers=None, start_date=None, end_date=None):
-    
+def get_company_aliases(engine):
+    # Пары (Ticker, Brand_Name) для словаря быстрого разбора запросов
+    store = _price_store
+    if store is not None:
+        return store.companies()
+    query = text("SELECT DISTINCT \"Ticker\", \"Brand_Name\" FROM stock_data ORDER BY \"Ticker\";")
+    with _connect(engine) as conn:
+        df = pd.read_sql(query, conn)
+    return list(df.itertuples(index=False, name=None))
+
+
+# -------------------------------------------------------
+#  Хранилище цен в памяти
+# -------------------------------------------------------
+
+PRICE_BACKEND = os.getenv("PRICE_BACKEND", "sql")  # sql | memory | snapshot
+
+_price_store = None
+
+
+def load_price_store(engine):
+    global _price_store
+    query = text(
+        "SELECT \"Date\", \"Ticker\", \"Brand_Name\", \"Open\", \"High\", \"Low\", \"Close\", \"Volume\" "
+        "FROM stock_data"
+    )
+    with _connect(engine) as conn:
+        df = pd.read_sql(query, conn)
+    # Подменяем ссылку целиком: читатели видят либо старое, либо новое хранилище
+    _price_store = PriceStore.from_frame(df)
+    return _price_store
+
+
+def load_snapshot_store(path=SNAPSHOT_DIR, fmt=SNAPSHOT_FORMAT):
+    # Снимок пишет loader.py --snapshot; файлы отображаются в память, а не копируются
+    global _price_store
+    _price_store = SnapshotStore(path, fmt)
+    return _price_store
+
+
+def reload_price_store(engine):
+    store = _price_store
+    if store is None:
+        return None
+    if isinstance(store, SnapshotStore):
+        return load_snapshot_store(store.path, store.fmt)
+    return load_price_store(engine)
+
+
+def get_price_store():
+    return _price_store
+
+
+def data_version(engine):
+    # Отпечаток загруженных цен: меняется после каждого запуска loader.py
+    store = _price_store
+    try:
+        if isinstance(store, SnapshotStore):
+            return f"snapshot:{os.path.basename(store.root)}"
+        query = text("SELECT COUNT(*), MAX(\"Date\"), SUM(\"Close\") FROM stock_data")
+        with _connect(engine) as conn:
+            rows, last, total = conn.execute(query).one()
+        return f"sql:{rows}:{last}:{total!r}"
+    except Exception as e:
+        print(f"Не удалось определить версию данных: {e}")
+        return None
+
+
+def init_price_backend(engine, backend=None):
+    backend = backend or PRICE_BACKEND
+    if backend not in ("memory", "snapshot"):
+        return None
+    try:
+        if backend == "snapshot":
+            return load_snapshot_store()
+        return load_price_store(engine)
+    except Exception as e:
+        # Остаёмся на запросах к Postgres
+        print(f"Не удалось загрузить цены ({backend}), используем БД: {e}")
+        return None
+
+
+# Колонки, которые нужны потребителям данных
+STATS_COLUMNS = ("Date", "Ticker", "Close")
+CHART_COLUMNS = ("Date", "Ticker", "Brand_Name", "Close")
+PRICE_COLUMNS = ("Date", "Ticker", "Brand_Name", "Open", "High", "Low", "Close", "Volume")
+
+
+def build_price_query(tickers=None, start_date=None, end_date=None, columns=PRICE_COLUMNS):
+    unknown = set(columns) - set(PRICE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Неизвестные колонки: {sorted(unknown)}")
+
     if isinstance(tickers, str):
         tickers = [tickers]
-    
-    q = "SELECT * FROM stock_data WHERE 1=1"
-    params={}
 
+    clauses = []
+    params = {}
+
+    # Тикеры хранятся в верхнем регистре (см. loader.py), поэтому индекс
+    # ("Ticker", "Date") используется без функции над колонкой
     if tickers:
-        q += " AND upper(\"Ticker\") IN :tickers"
-        params['tickers'] = tuple(t.upper() for t in tickers)
+        clauses.append("\"Ticker\" IN :tickers")
+        params['tickers'] = [t.upper() for t in tickers]
 
     if start_date:
-        q += f" AND \"Date\" >= TO_DATE('{start_date}', 'YYYY-MM-DD')"
-        params['start_date'] = start_date
-    
+        clauses.append("\"Date\" >= :start_date")
+        params['start_date'] = pd.Timestamp(start_date).to_pydatetime()
+
     if end_date:
-        q += f" AND \"Date\" <= TO_DATE('{end_date}', 'YYYY-MM-DD')"
-        params['end_date'] = end_date
-    
-    df = pd.read_sql(text(q), engine, params=params)
+        clauses.append("\"Date\" <= :end_date")
+        params['end_date'] = pd.Timestamp(end_date).to_pydatetime()
+
+    q = "SELECT " + ", ".join(f'"{c}"' for c in columns) + " FROM stock_data"
+    if clauses:
+        q += " WHERE " + " AND ".join(clauses)
+    q += " ORDER BY \"Date\", \"Ticker\""
+
+    query = text(q)
+    if tickers:
+        query = query.bindparams(bindparam("tickers", expanding=True))
+    return query, params
+
+
+def query_prices(engine, tickers=None, start_date=None, end_date=None, columns=PRICE_COLUMNS):
+
+    store = _price_store
+    if store is not None:
+        return store.query(tickers, start_date=start_date, end_date=end_date, columns=columns)
+
+    query, params = build_price_query(tickers, start_date, end_date, columns)
+    with _connect(engine) as conn:
+        df = pd.read_sql(query, conn, params=params)
     df['Date'] = pd.to_datetime(df['Date'])
-    return df.sort_values(by = 'Date').reset_index(drop=True)
+    return df
+
+
+def query_stats(engine, tickers=None, start_date=None, end_date=None, loader=None):
+    # Хранилище в памяти отвечает по префиксным суммам, иначе — compute_stats по выборке;
+    # loader позволяет взять кадр из кэша вызывающего
+    store = _price_store
+    if isinstance(store, PriceStore):
+        return store.stats(tickers, start_date=start_date, end_date=end_date)
+    if loader is not None:
+        return compute_stats(loader())
+    return compute_stats(query_prices(engine, tickers, start_date, end_date, columns=STATS_COLUMNS))
+
+
+def query_leaderboard(engine, period, tickers=None):
+    # Готовая сводка стандартного периода (строит loader.py): один поиск по индексу (period, rank)
+    if isinstance(tickers, str):
+        tickers = [tickers]
+    q = "SELECT " + ", ".join(f'"{c}"' for c in SUMMARY_COLUMNS) + f" FROM {SUMMARY_TABLE} WHERE \"period\" = :period"
+    params = {"period": period}
+    if tickers:
+        q += " AND \"Ticker\" IN :tickers"
+        params["tickers"] = [t.upper() for t in tickers]
+    q += " ORDER BY \"rank\""
+
+    query = text(q)
+    if tickers:
+        query = query.bindparams(bindparam("tickers", expanding=True))
+    with _connect(engine) as conn:
+        return pd.read_sql(query, conn, params=params)
 
 def compute_stats(df: pd.DataFrame):
 
     if df.empty:
         return None
 
-    results = {}
-
-    for ticker, group in df.groupby("Ticker"):
-        g = group.sort_values("Date")
+    # Все тикеры за один проход: сортируем по (тикер, дата) и считаем
+    # агрегаты по границам групп через reduceat
+    codes, tickers = pd.factorize(df["Ticker"], sort=True)
+    dates = df["Date"].to_numpy()
+    order = np.lexsort((dates, codes))
+    codes = codes[order]
+    close = df["Close"].to_numpy(dtype=np.float64)[order]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(close)]
+    counts = ends - starts
+
+    mean_close = np.add.reduceat(close, starts) / counts
+    min_close = np.minimum.reduceat(close, starts)
+    max_close = np.maximum.reduceat(close, starts)
+    start_price = close[starts]
+    end_price = close[ends - 1]
+
+    # Дневные доходности внутри тикера; первая точка каждой группы — NaN
+    returns = np.full(len(close), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = close[1:] / close[:-1] - 1
+    returns[starts] = np.nan
+    valid = ~np.isnan(returns)
+    n_returns = np.add.reduceat(valid.astype(np.int64), starts)
+
+    group = np.repeat(np.arange(len(starts)), counts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_return = np.add.reduceat(np.where(valid, returns, 0.0), starts) / n_returns
+        deviation = np.where(valid, returns - mean_return[group], 0.0)
+        volatility = np.sqrt(np.add.reduceat(deviation ** 2, starts) / (n_returns - 1))
+    volatility[n_returns < 2] = np.nan
 
+    results = {}
+    columns = zip(
+        tickers[codes[starts]],
+        mean_close.tolist(), min_close.tolist(), max_close.tolist(),
+        start_price.tolist(), end_price.tolist(), volatility.tolist(),
+    )
+    for ticker, mean_, min_, max_, start_, end_, vol in columns:
         stats = {
             "ticker": ticker,
-            "mean_close": float(g["Close"].mean()),
-            "min_close": float(g["Close"].min()),
-            "max_close": float(g["Close"].max()),
-            "start_price": float(g["Close"].iloc[0]),
-            "end_price": float(g["Close"].iloc[-1]),
+            "mean_close": mean_,
+            "min_close": min_,
+            "max_close": max_,
+            "start_price": start_,
+            "end_price": end_,
         }
 
         stats["change_abs"] = stats["end_price"] - stats["start_price"]
@@ -66,16 +345,13 @@ def compute_stats(df: pd.DataFrame):
             else None
         )
 
-        stats["volatility"] = float(g["Close"].pct_change().dropna().std())
+        stats["volatility"] = vol
 
         results[ticker] = stats
 
-    # if len(results) == 1:
-    #     return list(results.values())[0]
-
     return results
 
-def plot_price_chart(df: pd.DataFrame):
+def plot_price_chart(df: pd.DataFrame, dpi=None):
 
     plt.figure(figsize=(12, 6))
 
@@ -94,13 +370,13 @@ def plot_price_chart(df: pd.DataFrame):
     plt.tight_layout()
 
     buf = io.BytesIO()
-    plt.savefig(buf, format="png")
+    plt.savefig(buf, format="png", dpi=dpi)
     plt.close()
     buf.seek(0)
 
     return buf
 
-def plot_volatility_chart(df: pd.DataFrame, window=10):
+def plot_volatility_chart(df: pd.DataFrame, window=10, dpi=None):
     plt.figure(figsize=(12, 6))
 
     for ticker, group in df.groupby("Ticker"):
@@ -117,12 +393,12 @@ def plot_volatility_chart(df: pd.DataFrame, window=10):
     plt.tight_layout()
 
     buf = io.BytesIO()
-    plt.savefig(buf, format="png")
+    plt.savefig(buf, format="png", dpi=dpi)
     plt.close()
     buf.seek(0)
     return buf
 
-def plot_returns_histogram(df: pd.DataFrame, bins=30):
+def plot_returns_histogram(df: pd.DataFrame, bins=30, dpi=None):
     plt.figure(figsize=(10, 6))
 
     for ticker, group in df.groupby("Ticker"):
@@ -137,7 +413,7 @@ def plot_returns_histogram(df: pd.DataFrame, bins=30):
     plt.tight_layout()
 
     buf = io.BytesIO()
-    plt.savefig(buf, format="png")
+    plt.savefig(buf, format="png", dpi=dpi)
     plt.close()
     buf.seek(0)
     return buf
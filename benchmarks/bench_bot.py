@@ -0,0 +1,312 @@
+# bench_bot.py
+# Сквозной нагрузочный стенд: настоящие handle_text и callback_handler, заглушки
+# Bot API и GigaChat с настраиваемой задержкой, синтетическая stock_data в SQLite
+# (или в Postgres по --db-url). Печатает запросы/с, перцентили по целям и память.
+# Запуск из корня репозитория:
+#   python benchmarks/bench_bot.py --requests 2000 --chats 200 --tickers 30
+#   python benchmarks/bench_bot.py --backend memory --giga-latency 0.3 --json bench.json
+import argparse
+import base64
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from giga_stub_server import start_stub_server
+from webhook_load import BotApiState, start_bot_api_stub
+
+TECH = [
+    ("AAPL", "apple"), ("MSFT", "microsoft"), ("NVDA", "nvidia"), ("GOOGL", "google"),
+    ("META", "meta platforms"), ("AMZN", "amazon"), ("INTC", "intel"), ("AMD", "amd"),
+    ("ADBE", "adobe"), ("CSCO", "cisco"), ("ORCL", "oracle"), ("CRM", "salesforce"),
+    ("IBM", "ibm"), ("QCOM", "qualcomm"), ("TXN", "texas instruments"), ("AVGO", "broadcom"),
+    ("SONY", "sony"), ("LOGI", "logitech"), ("ZM", "zoom"), ("NFLX", "netflix"),
+]
+
+PERIODS = ("за март", "за 2 квартал", "за первое полугодие", "за год", "с 5 марта по 20 мая",
+           "за декабрь", "за третий квартал", "")
+
+# (вес, сценарий); сценарий — список сообщений и нажатий одного чата
+MIX = (
+    (25, "chart"),
+    (20, "stats"),
+    (10, "analysis"),
+    (10, "giga"),
+    (15, "meme"),
+    (8, "compare"),
+    (7, "top"),
+    (5, "buttons"),
+)
+
+
+# -------------------------------------------------------
+#  Синтетическая stock_data
+# -------------------------------------------------------
+
+def generate_stock_data(n_tickers, start="2024-01-01", end="2024-12-31", seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, end)
+    companies = list(TECH[:n_tickers])
+    companies += [(f"TK{i:03d}", f"company {i}") for i in range(len(companies), n_tickers)]
+    frames = []
+    for ticker, brand in companies:
+        close = 50 + 150 * rng.random()
+        close = close * np.exp(np.cumsum(rng.normal(0.0004, 0.02, len(dates))))
+        spread = close * rng.uniform(0.002, 0.02, len(dates))
+        frames.append(pd.DataFrame({
+            "Date": dates, "Open": close + rng.normal(0, 1, len(dates)) * spread / 2,
+            "High": close + spread, "Low": close - spread, "Close": close,
+            "Volume": rng.integers(1_000_000, 50_000_000, len(dates)).astype(float),
+            "Brand_Name": brand, "Ticker": ticker, "Industry_Tag": "technology", "Country": "usa",
+        }))
+    return pd.concat(frames, ignore_index=True), companies
+
+
+def load_fixture(url, df):
+    from sqlalchemy import create_engine, text
+    from summaries import SUMMARY_TABLE, summarize_periods
+
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {SUMMARY_TABLE}"))
+        conn.execute(text("DROP TABLE IF EXISTS stock_data"))
+    df.to_sql("stock_data", engine, index=False, chunksize=10_000)
+    summarize_periods(df).to_sql(SUMMARY_TABLE, engine, index=False)
+    with engine.begin() as conn:
+        conn.execute(text('CREATE UNIQUE INDEX ux_stock_data_ticker_date ON stock_data ("Ticker", "Date")'))
+        conn.execute(text(f'CREATE INDEX ix_{SUMMARY_TABLE}_period_rank ON {SUMMARY_TABLE} ("period", "rank")'))
+    engine.dispose()
+
+
+# -------------------------------------------------------
+#  Смесь запросов
+# -------------------------------------------------------
+
+def scenario(kind, rng, companies, max_tickers):
+    def names():
+        k = rng.randint(1, max_tickers)
+        picked = rng.sample(companies, min(k, len(companies)))
+        # Вперемешку тикеры и названия брендов, как пишут пользователи
+        return " и ".join(t if rng.random() < 0.6 else b for t, b in picked)
+
+    period = rng.choice(PERIODS)
+    if kind == "chart":
+        return [("text", f"график {names()} {period}"),
+                ("callback", rng.choice(("graph_price", "graph_return", "graph_volatility")))]
+    if kind == "stats":
+        return [("text", f"статистика {names()} {period}")]
+    if kind == "analysis":
+        return [("text", f"анализ {names()} {period}")]
+    if kind == "giga":
+        # Локальный разбор не справится — запрос уходит в GigaChat
+        return [("text", f"как вела себя {names()} после отчёта {rng.randint(1, 10_000)}")]
+    if kind == "meme":
+        return [("text", "🎭 Мем")]
+    if kind == "compare":
+        return [("text", f"сравни {names()} и {rng.choice(companies)[0]} {period}")]
+    if kind == "top":
+        return [("text", f"топ {period}")]
+    return [("text", f"статистика {names()} {period}"),
+            ("callback", "want_stats"), ("callback", "want_graph"), ("callback", "graph_price")]
+
+
+def build_updates(n_requests, n_chats, companies, max_tickers, seed=0):
+    rng = random.Random(seed)
+    kinds = [kind for weight, kind in MIX for _ in range(weight)]
+    updates = []
+    update_id = 0
+    while len(updates) < n_requests:
+        chat_id = 10_000 + rng.randrange(n_chats)
+        for step, payload in scenario(rng.choice(kinds), rng, companies, max_tickers):
+            update_id += 1
+            updates.append(make_update(update_id, chat_id, step, payload))
+    return updates[:n_requests]
+
+
+def make_update(update_id, chat_id, step, payload):
+    import telebot
+
+    sender = {"id": chat_id, "is_bot": False, "first_name": "bench"}
+    message = {"message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "from": sender}
+    if step == "text":
+        body = {"update_id": update_id, "message": {**message, "text": payload}}
+    else:
+        body = {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "from": sender, "message": message, "chat_instance": "bench", "data": payload,
+        }}
+    return telebot.types.Update.de_json(json.dumps(body))
+
+
+# -------------------------------------------------------
+#  Прогон
+# -------------------------------------------------------
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def configure(args, workdir):
+    # Заглушки и временные каталоги — до импорта модулей бота: они читают окружение при импорте
+    _, giga_state, giga_base, giga_auth = start_stub_server(latency=args.giga_latency, fail_rate=args.giga_fail_rate)
+    api_state = BotApiState(args.api_latency)
+    _, api_url = start_bot_api_stub(api_state)
+
+    os.environ.update({
+        "GIGACHAT_BASE_URL": giga_base,
+        "GIGACHAT_AUTH_URL": giga_auth,
+        "PRICE_BACKEND": args.backend,
+        "HANDLER_THREADS": str(args.threads),
+        "RENDER_PROCESSES": str(args.render_processes),
+        "CHART_RENDER_MODE": args.render_mode,
+        "CHART_CACHE_DIR": os.path.join(workdir, "charts"),
+        "LLM_CACHE_PATH": "" if args.no_llm_cache else os.path.join(workdir, "llm.sqlite3"),
+        "SNAPSHOT_DIR": os.path.join(workdir, "snapshot"),
+        "MEME_INDEX_PATH": os.path.join(workdir, "memes.json"),
+    })
+
+    # config/config.py с секретами не хранится в репозитории — значения для стенда
+    config = types.ModuleType("config.config")
+    config.TELEGRAM_TOKEN = "123456:bench"
+    config.DATABASE_URL = args.db_url or f"sqlite:///{os.path.join(workdir, 'stock_data.sqlite3')}"
+    config.GIGACHAT_CLIENT_SECRET = base64.b64encode(b"bench:secret").decode()
+    package = types.ModuleType("config")
+    package.config = config
+    sys.modules.setdefault("config", package)
+    sys.modules.setdefault("config.config", config)
+    return config, api_url, api_state, giga_state
+
+
+def run(args):
+    output = os.path.abspath(args.json) if args.json else ""
+    workdir = tempfile.mkdtemp(prefix="bench-bot-")
+    config, api_url, api_state, giga_state = configure(args, workdir)
+
+    df, companies = generate_stock_data(args.tickers, seed=args.seed)
+    started = time.perf_counter()
+    load_fixture(config.DATABASE_URL, df)
+    print(f"stock_data: {len(df)} строк, {len(companies)} тикеров, загрузка {time.perf_counter() - started:.1f} с")
+
+    if args.backend == "snapshot":
+        from sqlalchemy import create_engine
+        import loader
+        loader.export_snapshot(create_engine(config.DATABASE_URL))
+
+    import telebot
+    telebot.apihelper.API_URL = api_url + "/bot{0}/{1}"
+
+    rss_before = rss_mb()
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    os.chdir(ROOT)  # memes/ ищется относительно рабочего каталога
+    import DailyPriceBot as bot_module
+    from metrics import metrics
+
+    updates = build_updates(args.requests, args.chats, companies, args.max_tickers, seed=args.seed)
+    if args.warmup:
+        bot_module.bot.process_new_updates(build_updates(args.warmup, args.chats, companies, args.max_tickers, seed=args.seed + 1))
+        wait_idle(bot_module.dispatcher)
+        metrics.reset()  # прогрев в отчёт не попадает
+
+    dispatcher = bot_module.dispatcher
+    base = dispatcher.stats()
+    started = time.perf_counter()
+    # Как polling: обновления пачками по 100, backpressure диспетчера тормозит приём
+    for i in range(0, len(updates), 100):
+        bot_module.bot.process_new_updates(updates[i:i + 100])
+    wait_idle(dispatcher)
+    elapsed = time.perf_counter() - started
+
+    stats = dispatcher.stats()
+    handled = stats["completed"] + stats["failed"] - base["completed"] - base["failed"]
+    result = {
+        "requests": len(updates),
+        "handled": handled,
+        "failed": stats["failed"] - base["failed"],
+        "seconds": elapsed,
+        "rps": handled / elapsed,
+        "queue_wait_p50": stats["wait_p50"],
+        "queue_wait_p95": stats["wait_p95"],
+        "bot_api_calls": api_state.calls,
+        "giga_calls": giga_state.chat_calls,
+        "rss_before_mb": rss_before,
+        "rss_after_mb": rss_mb(),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "frame_cache": bot_module.frame_cache.stats(),
+        "memes": bot_module.meme_index.stats(),
+        "gauges": metrics.gauges(),
+        "stages": {
+            f"{kind}/{aim}/{stage}": {"n": n, "p50": q[0.5], "p95": q[0.95], "p99": q[0.99]}
+            for (kind, stage, aim), (n, _, q) in metrics.snapshot().items()
+        },
+    }
+    if args.tracemalloc:
+        result["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    print(f"\nзапросов: {result['requests']}, обработано: {handled}, ошибок: {result['failed']}, "
+          f"чатов: {args.chats}, потоков: {args.threads}, backend: {args.backend}")
+    print(f"пропускная способность: {result['rps']:.1f} запросов/с за {elapsed:.1f} с")
+    print(f"ожидание в очереди: p50 {stats['wait_p50'] * 1000:.0f} мс, p95 {stats['wait_p95'] * 1000:.0f} мс")
+    print(f"вызовов Bot API: {api_state.calls}, GigaChat: {giga_state.chat_calls}, "
+          f"кэш кадров: {result['frame_cache'].get('hit_rate', 0):.0%}, "
+          f"мемов загружено: {result['memes']['uploads']}, по file_id: {result['memes']['file_id_sends']}")
+    memory = f"память: RSS {rss_before:.0f} → {result['rss_after_mb']:.0f} МБ, пик {result['max_rss_mb']:.0f} МБ"
+    if args.tracemalloc:
+        memory += f", tracemalloc пик {result['tracemalloc_peak_mb']:.1f} МБ"
+    print(memory)
+    print()
+    print(metrics.report())
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def wait_idle(dispatcher, poll=0.01):
+    while True:
+        stats = dispatcher.stats()
+        if stats["queue_depth"] == 0 and stats["running"] == 0:
+            return
+        time.sleep(poll)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный стенд бота")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=0, help="запросов для прогрева кэшей")
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--max-tickers", type=int, default=3, help="тикеров в одном запросе, не больше")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--backend", default="sql", choices=("sql", "memory", "snapshot"))
+    parser.add_argument("--render-mode", default="fast", choices=("classic", "fast"))
+    parser.add_argument("--render-processes", type=int, default=0)
+    parser.add_argument("--api-latency", type=float, default=0.03, help="задержка Bot API, с")
+    parser.add_argument("--giga-latency", type=float, default=0.5, help="задержка GigaChat, с")
+    parser.add_argument("--giga-fail-rate", type=float, default=0.0)
+    parser.add_argument("--no-llm-cache", action="store_true")
+    parser.add_argument("--db-url", default="", help="Postgres вместо временной SQLite")
+    parser.add_argument("--tracemalloc", action="store_true", help="пик выделений Python (медленнее)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default="", help="сохранить результат для сравнения прогонов")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# bench_charts.py
+# Время отрисовки и размер картинки по типам графиков и режимам рендера.
+# Запуск из корня репозитория: python benchmarks/bench_charts.py
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chart_render import render_chart
+
+VARIANTS = [
+    ("classic", 100, "png"),
+    ("fast", 100, "png"),
+    ("fast", 100, "png8"),
+    ("fast", 100, "webp"),
+    ("fast", 72, "png8"),
+    ("fast", 72, "webp"),
+]
+
+
+def make_frame(n_tickers=3, days=252, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-01", periods=days)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_tickers, days)), axis=1))
+    tickers = [f"T{i:02d}" for i in range(n_tickers)]
+    return pd.DataFrame({
+        "Date": np.tile(dates.values, n_tickers),
+        "Ticker": np.repeat(tickers, days),
+        "Brand_Name": np.repeat([t.lower() for t in tickers], days),
+        "Close": close.ravel(),
+    }).sort_values(["Date", "Ticker"]).reset_index(drop=True)
+
+
+def main(repeat=7):
+    df = make_frame()
+    print(f"{'chart':>11} {'mode':>8} {'dpi':>4} {'format':>6} {'median, ms':>11} {'bytes':>9}")
+    for kind in ("price", "returns", "volatility"):
+        for mode, dpi, fmt in VARIANTS:
+            render_chart(kind, df, mode=mode, dpi=dpi, fmt=fmt)  # прогрев шаблона
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                data = render_chart(kind, df, mode=mode, dpi=dpi, fmt=fmt)
+                timings.append(time.perf_counter() - started)
+            print(f"{kind:>11} {mode:>8} {dpi:>4} {fmt:>6} {statistics.median(timings) * 1000:>11.1f} {len(data):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_compute_stats.py
+# Сравнение векторизованного compute_stats с прежней реализацией через groupby.
+# Запуск из корня репозитория: python benchmarks/bench_compute_stats.py
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import compute_stats
+
+
+def compute_stats_groupby(df: pd.DataFrame):
+    # Прежняя реализация: цикл по тикерам
+    if df.empty:
+        return None
+
+    results = {}
+    for ticker, group in df.groupby("Ticker"):
+        g = group.sort_values("Date")
+        stats = {
+            "ticker": ticker,
+            "mean_close": float(g["Close"].mean()),
+            "min_close": float(g["Close"].min()),
+            "max_close": float(g["Close"].max()),
+            "start_price": float(g["Close"].iloc[0]),
+            "end_price": float(g["Close"].iloc[-1]),
+        }
+        stats["change_abs"] = stats["end_price"] - stats["start_price"]
+        stats["change_pct"] = (
+            stats["change_abs"] / stats["start_price"] * 100
+            if stats["start_price"] != 0
+            else None
+        )
+        stats["volatility"] = float(g["Close"].pct_change().dropna().std())
+        results[ticker] = stats
+    return results
+
+
+def make_frame(n_tickers, days=252, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-01", periods=days)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_tickers, days)), axis=1))
+    df = pd.DataFrame({
+        "Date": np.tile(dates.values, n_tickers),
+        "Ticker": np.repeat([f"T{i:04d}" for i in range(n_tickers)], days),
+        "Close": close.ravel(),
+    })
+    # Как из query_prices: отсортировано по дате, тикеры вперемешку
+    return df.sort_values(["Date", "Ticker"]).reset_index(drop=True)
+
+
+def check_equal(a, b):
+    assert a.keys() == b.keys()
+    for ticker in a:
+        for key, value in a[ticker].items():
+            other = b[ticker][key]
+            if isinstance(value, float):
+                assert np.isclose(value, other, rtol=1e-9, equal_nan=True), (ticker, key, value, other)
+            else:
+                assert value == other, (ticker, key, value, other)
+
+
+def best_of(fn, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    print(f"{'tickers':>8} {'rows':>8} {'groupby, ms':>12} {'vectorized, ms':>15} {'speedup':>8}")
+    for n in (10, 100, 1000):
+        df = make_frame(n)
+        check_equal(compute_stats_groupby(df), compute_stats(df))
+        repeat = 5 if n < 1000 else 3
+        old = best_of(compute_stats_groupby, df, repeat)
+        new = best_of(compute_stats, df, repeat)
+        print(f"{n:>8} {len(df):>8} {old * 1000:>12.2f} {new * 1000:>15.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# bench_query_parser.py
+# Доля запросов, которые разбирает быстрый парсер без GigaChat, и время разбора.
+# Запуск из корня репозитория: python benchmarks/bench_query_parser.py [файл с запросами]
+# Файл — по одному запросу в строке (например, выгрузка реальных сообщений).
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_parser import QueryParser
+
+COMPANIES = [
+    ("AAPL", "apple"), ("MSFT", "microsoft"), ("NVDA", "nvidia"), ("GOOGL", "google"),
+    ("META", "meta platforms"), ("INTC", "intel"), ("AMD", "amd"), ("ADBE", "adobe"),
+    ("CSCO", "cisco"), ("ZM", "zoom"), ("SONY", "sony"), ("LOGI", "logitech"),
+]
+
+SAMPLE = [
+    "График AAPL за март",
+    "Покажи график Apple за март",
+    "Статистика NVDA и MSFT за апрель",
+    "Сделай анализ Google за первое полугодие",
+    "Анализ Google за год",
+    "статистика эппла за 2 квартал",
+    "покажи нвидию с 5 марта по 20 мая",
+    "График AAPL за 2-й квартал 2024 года",
+    "статистика amd q3",
+    "график интел за май",
+    "График apple и microsoft с марта по июнь",
+    "Покажи статистику AAPL",
+    "анализ meta за второе полугодие",
+    "график ZM за декабрь",
+    "что лучше купить apple или msft",
+    "как дела?",
+    "расскажи про рынок",
+    "график AAPL 5 марта",
+    "как вела себя Nvidia после отчёта в мае",
+    "Статистика CSCO за третий квартал",
+]
+
+
+def main():
+    messages = SAMPLE
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip()]
+
+    parser = QueryParser(COMPANIES)
+    misses = []
+    started = time.perf_counter()
+    for message in messages:
+        if parser.parse(message) is None:
+            misses.append(message)
+    elapsed = time.perf_counter() - started
+
+    stats = parser.stats()
+    print(f"запросов: {stats['calls']}, разобрано локально: {stats['hits']} ({stats['hit_rate']:.0%})")
+    print(f"среднее время разбора: {elapsed / max(1, stats['calls']) * 1e6:.1f} мкс")
+    print("\nУшли в GigaChat:")
+    for message in misses:
+        print(f"  • {message}")
+
+
+if __name__ == "__main__":
+    main()
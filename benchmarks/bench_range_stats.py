@@ -0,0 +1,83 @@
+# bench_range_stats.py
+# Статистика за произвольный период: compute_stats по выборке из PriceStore против
+# префиксных сумм (PriceStore.stats). Заодно сверяет результаты на случайных отрезках.
+# Запуск из корня репозитория: python benchmarks/bench_range_stats.py
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import compute_stats, STATS_COLUMNS
+from price_store import PriceStore
+from bench_compute_stats import check_equal
+
+QUERIES = 200
+
+
+def make_store(n_tickers, days=252, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-01", periods=days)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_tickers, days)), axis=1))
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    df = pd.DataFrame({
+        "Date": np.tile(dates.values, n_tickers),
+        "Ticker": np.repeat(tickers, days),
+        "Brand_Name": np.repeat(tickers, days),
+        "Open": close.ravel(), "High": close.ravel(), "Low": close.ravel(),
+        "Close": close.ravel(), "Volume": 1e6,
+    })
+    return PriceStore.from_frame(df), tickers
+
+
+def random_queries(tickers, count, seed=1):
+    # Запросы как от пользователей: 1–3 тикера, произвольные границы внутри года
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2024-01-01", "2024-12-31")
+    queries = []
+    for _ in range(count):
+        selected = list(rng.choice(tickers, size=rng.integers(1, 4), replace=False))
+        a, b = sorted(rng.choice(len(days), size=2, replace=False))
+        queries.append((selected, days[a].date().isoformat(), days[b].date().isoformat()))
+    return queries
+
+
+def run(fn, queries):
+    started = time.perf_counter()
+    for query in queries:
+        fn(*query)
+    return (time.perf_counter() - started) / len(queries)
+
+
+def main():
+    print(f"{'tickers':>8} {'scan, мкс':>10} {'prefix, мкс':>12} {'speedup':>8} {'index, KB':>10}")
+    for n in (10, 100, 1000):
+        store, tickers = make_store(n)
+        queries = random_queries(tickers, QUERIES)
+
+        def scan(selected, start, end):
+            return compute_stats(store.query(selected, start, end, columns=STATS_COLUMNS))
+
+        def prefix(selected, start, end):
+            return store.stats(selected, start, end)
+
+        for query in queries:
+            expected, actual = scan(*query), prefix(*query)
+            if expected is None:
+                assert actual is None, query
+            else:
+                check_equal(expected, actual)
+        # Весь год по всем тикерам — тот же результат
+        check_equal(compute_stats(store.query(columns=STATS_COLUMNS)), store.stats())
+
+        old = run(scan, queries)
+        new = run(prefix, queries)
+        index_kb = sum(r.nbytes() for r in store.ranges.values()) / 1024
+        print(f"{n:>8} {old * 1e6:>10.1f} {new * 1e6:>12.1f} {old / new:>7.1f}x {index_kb:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
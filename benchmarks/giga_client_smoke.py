@@ -0,0 +1,84 @@
+# giga_client_smoke.py
+# Проверка GigaClient против локальной заглушки: клиент опирается на внутренности
+# gigachat SDK (_parse_chat, api.post_chat, _client, _decorator, _access_token,
+# _reset_token), поэтому после обновления gigachat в requirements.txt запускать первым делом.
+# Запуск из корня репозитория:
+#   python benchmarks/giga_client_smoke.py
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from giga_stub_server import start_stub_server
+
+PAYLOAD = {"messages": [{"role": "user", "content": "привет"}]}
+
+
+def make_client(state_kwargs, **client_kwargs):
+    _, state, base_url, auth_url = start_stub_server(**state_kwargs)
+    # Адреса SDK читает из окружения при создании клиента
+    os.environ["GIGACHAT_BASE_URL"] = base_url
+    os.environ["GIGACHAT_AUTH_URL"] = auth_url
+    from giga_client import GigaClient
+    return GigaClient(base64.b64encode(b"smoke:secret").decode(), **client_kwargs), state
+
+
+def reply(response):
+    return response.choices[0].message.content
+
+
+def check_token_refresh():
+    # Срок токена меньше GIGACHAT_TOKEN_REFRESH_MARGIN — клиент обновляет его до вызова
+    client, state = make_client({"token_ttl": 60})
+    reply(client.chat(PAYLOAD))
+    reply(client.chat(PAYLOAD))
+    assert state.tokens_issued == 2, f"ожидали 2 токена, выдано {state.tokens_issued}"
+
+    # Токен отозван на сервере: 401, SDK получает новый и повторяет вызов
+    client, state = make_client({"token_ttl": 1800})
+    reply(client.chat(PAYLOAD))
+    state.min_token = state.tokens_issued + 1
+    reply(client.chat(PAYLOAD))
+    assert state.tokens_issued == 2, f"ожидали 2 токена, выдано {state.tokens_issued}"
+    assert client.stats()["failures"] == 0
+
+
+def check_retry():
+    client, state = make_client({})
+    state.fail_next = 1
+    reply(client.chat(PAYLOAD))
+    stats = client.stats()
+    assert stats["retries"] == 1 and stats["failures"] == 0, stats
+    assert state.chat_calls == 2 and state.failed_calls == 1
+
+
+def check_deadline():
+    # Одна попытка не дольше общего лимита, хотя таймаут клиента больше
+    client, _ = make_client({"latency": 2.0}, timeout=20)
+    started = time.monotonic()
+    try:
+        client.chat(PAYLOAD, deadline=0.5)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("ожидали таймаут")
+    elapsed = time.monotonic() - started
+    assert elapsed < 1.0, f"вызов длился {elapsed:.2f} с при лимите 0.5 с"
+
+
+def main():
+    failed = False
+    for check in (check_token_refresh, check_retry, check_deadline):
+        try:
+            check()
+            print(f"ok    {check.__name__}")
+        except Exception as e:
+            failed = True
+            print(f"FAIL  {check.__name__}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# giga_stub_server.py
+# Локальная заглушка GigaChat API (OAuth + /chat/completions) для проверки клиента.
+# Запуск:  python benchmarks/giga_stub_server.py --port 8099 --latency 0.2 --fail-rate 0.1
+# Бот:     GIGACHAT_BASE_URL=http://127.0.0.1:8099/api/v1 GIGACHAT_AUTH_URL=http://127.0.0.1:8099/oauth
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PARSE_REPLY = {
+    "Aim": "статистика",
+    "ticker": ["AAPL"],
+    "start_date": "2024-03-01",
+    "end_date": "2024-03-31",
+    "period": "март",
+}
+
+
+class StubState:
+
+    def __init__(self, latency=0.0, fail_rate=0.0, token_ttl=1800, reply=None):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.token_ttl = token_ttl
+        self.reply = reply
+        self.fail_next = 0  # столько следующих вызовов гарантированно ответят 503
+        self.min_token = 0  # токены с меньшим номером считаются отозванными (401)
+        self.tokens_issued = 0
+        self.chat_calls = 0
+        self.failed_calls = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length)
+
+            if self.path.endswith("/oauth"):
+                with state.lock:
+                    state.tokens_issued += 1
+                    n = state.tokens_issued
+                expires_at = int((time.time() + state.token_ttl) * 1000)
+                return self._send(200, {"access_token": f"stub-{n}", "expires_at": expires_at})
+
+            if self.path.endswith("/chat/completions"):
+                auth = self.headers.get("Authorization", "")
+                if not auth.startswith("Bearer stub-") or int(auth[len("Bearer stub-"):]) < state.min_token:
+                    return self._send(401, {"message": "unauthorized"})
+                time.sleep(state.latency)
+                with state.lock:
+                    state.chat_calls += 1
+                    failed = state.fail_next > 0 or random.random() < state.fail_rate
+                    state.fail_next = max(0, state.fail_next - 1)
+                    state.failed_calls += failed
+                if failed:
+                    return self._send(503, {"message": "stub failure"})
+                return self._send(200, self._completion(json.loads(raw or b"{}")))
+
+            self._send(404, {"message": "not found"})
+
+        def _completion(self, request):
+            messages = request.get("messages", [])
+            prompt = messages[-1]["content"] if messages else ""
+            if state.reply is not None:
+                content = state.reply
+            elif "JSON" in prompt and "Запрос пользователя" in prompt:
+                content = json.dumps(PARSE_REPLY, ensure_ascii=False)
+            else:
+                content = "Заглушка: краткий анализ по запросу."
+            return {
+                "choices": [{"message": {"role": "assistant", "content": content}, "index": 0, "finish_reason": "stop"}],
+                "created": int(time.time()),
+                "model": request.get("model", "GigaChat"),
+                "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(content), "total_tokens": len(prompt) + len(content)},
+                "object": "chat.completion",
+            }
+
+    return Handler
+
+
+def start_stub_server(port=0, **state_kwargs):
+    # Запуск в фоне; возвращает (сервер, состояние, base_url, auth_url)
+    state = StubState(**state_kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, state, f"http://{host}:{port}/api/v1", f"http://{host}:{port}/oauth"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=float, default=1800)
+    args = parser.parse_args()
+
+    state = StubState(latency=args.latency, fail_rate=args.fail_rate, token_ttl=args.token_ttl)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"GigaChat stub: http://127.0.0.1:{args.port}/api/v1 (auth: /oauth)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# webhook_load.py
+# Нагрузочная проверка webhook-режима без Telegram: локальная заглушка Bot API
+# и генератор, который шлёт обновления по нескольким keep-alive соединениям,
+# как это делает сам Telegram.
+# Запуск из корня репозитория:
+#   python benchmarks/webhook_load.py --updates 5000 --chats 500 --connections 40
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telebot
+
+from dispatcher import ChatDispatcher, _percentile
+from webhook import WebhookServer
+
+TOKEN = "123456:stub"
+
+
+class BotApiState:
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+
+def start_bot_api_stub(state, port=0):
+    # Отвечает на любой метод Bot API сообщением-заглушкой
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            with state.lock:
+                state.calls += 1
+                n = state.calls
+            if state.latency:
+                time.sleep(state.latency)
+            result = {"message_id": n, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "ok"}
+            if self.path.split("?", 1)[0].endswith("/sendPhoto"):
+                # file_id, который бот сохранит и пришлёт повторно вместо картинки
+                result["photo"] = [{"file_id": f"stub-photo-{n}", "file_unique_id": f"u{n}", "width": 1, "height": 1}]
+            body = json.dumps({"ok": True, "result": result}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def make_update(update_id, chat_id):
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": f"запрос {update_id}",
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+        },
+    }).encode()
+
+
+async def telegram_connection(port, path, jobs, results):
+    # Одно keep-alive соединение: следующий запрос — только после ответа на предыдущий
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while jobs:
+            body = jobs.pop()
+            started = time.perf_counter()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: bot\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length"):
+                    length = int(line.split(b":")[1])
+            if length:
+                await reader.readexactly(length)
+            results.append((status, time.perf_counter() - started))
+    finally:
+        writer.close()
+
+
+async def run(args):
+    api, api_url = start_bot_api_stub(BotApiState(args.api_latency))
+    telebot.apihelper.API_URL = api_url + "/bot{0}/{1}"
+
+    bot = telebot.TeleBot(TOKEN, threaded=False)
+    dispatcher = ChatDispatcher(max_workers=args.threads, max_pending=args.max_pending)
+
+    @bot.message_handler(func=lambda m: True)
+    @dispatcher.per_chat(lambda message: message.chat.id)
+    def handle(message):
+        # Имитация обработки: разбор, выборка, ответ
+        time.sleep(args.work)
+        bot.send_message(message.chat.id, "ok")
+
+    server = WebhookServer(bot, dispatcher, path="/telegram", max_in_flight=args.max_in_flight)
+    port = await server.start("127.0.0.1", 0)
+
+    jobs = [make_update(i, 1000 + i % args.chats) for i in range(args.updates)][::-1]
+    results = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        telegram_connection(port, "/telegram", jobs, results) for _ in range(args.connections)
+    ))
+    acked = time.perf_counter() - started
+
+    while dispatcher.stats()["completed"] + dispatcher.stats()["failed"] < server.received:
+        await asyncio.sleep(0.01)
+    done = time.perf_counter() - started
+
+    latencies = [latency for status, latency in results]
+    rejected = sum(status != 200 for status, _ in results)
+    stats = dispatcher.stats()
+    print(f"обновлений: {args.updates}, чатов: {args.chats}, соединений: {args.connections}, "
+          f"потоков: {args.threads}")
+    print(f"подтверждено за {acked:.2f} с ({len(results) / acked:,.0f} обн/с), отклонено (503): {rejected}")
+    print(f"ответ webhook: p50 {_percentile(latencies, 0.5) * 1000:.1f} мс, "
+          f"p95 {_percentile(latencies, 0.95) * 1000:.1f} мс, p99 {_percentile(latencies, 0.99) * 1000:.1f} мс")
+    print(f"обработано за {done:.2f} с ({stats['completed'] / done:,.0f} обн/с), пачек: {server.batches}, "
+          f"ожидание в очереди p95 {stats['wait_p95'] * 1000:.0f} мс")
+
+    await server.stop()
+    dispatcher.shutdown()
+    api.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--connections", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--max-pending", type=int, default=500)
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--work", type=float, default=0.005, help="время обработчика, с")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="задержка Bot API, с")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# change_listener.py
+import json
+import select
+import threading
+import time
+import traceback
+
+# Канал NOTIFY, в который пишет loader.py после загрузки данных
+CHANGES_CHANNEL = "stock_data_changed"
+
+
+def _listen_loop(engine, callback, channel, poll_timeout):
+    while True:
+        conn = None
+        try:
+            # Отдельное соединение вне пула: LISTEN держит его всё время работы бота
+            raw = engine.raw_connection()
+            raw.detach()
+            conn = raw.driver_connection
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {channel}")
+            while True:
+                if select.select([conn], [], [], poll_timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        callback(json.loads(notify.payload or "{}"))
+                    except Exception:
+                        traceback.print_exc()
+        except Exception as e:
+            print(f"Подписка на изменения stock_data прервалась: {e}")
+        finally:
+            # Соединение отсоединено от пула — закрываем сами, иначе на сервере остаётся backend
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(5)
+
+
+def listen_for_changes(engine, callback, channel=CHANGES_CHANNEL, poll_timeout=30):
+    # callback получает {"mode", "tickers" (None — всё), "start", "end"}
+    if engine.dialect.name != "postgresql":
+        return None
+    thread = threading.Thread(
+        target=_listen_loop, args=(engine, callback, channel, poll_timeout),
+        name="stock-data-listener", daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,186 @@
+# chart_cache.py
+import hashlib
+import json
+import os
+import threading
+
+from frame_cache import normalize_tickers
+
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", ".chart_cache")
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+# Записей в индексе (с file_id, но уже без файла) — не больше стольких
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "10000"))
+# Увеличивать при любом изменении внешнего вида графиков
+CHART_STYLE_VERSION = "2"
+
+
+def chart_key(kind, tickers, start_date=None, end_date=None, params=None, style=CHART_STYLE_VERSION):
+    payload = json.dumps(
+        [kind, normalize_tickers(tickers), start_date, end_date, params or {}, style],
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ChartCache:
+    """Готовые картинки графиков на диске + file_id, выданные Telegram после отправки."""
+
+    def __init__(self, directory=CHART_CACHE_DIR, max_bytes=CHART_CACHE_MAX_BYTES,
+                 max_entries=CHART_CACHE_MAX_ENTRIES, data_version=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(directory, "index.json")
+        self.hits = {"file_id": 0, "disk": 0}
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        # key -> {"tickers": [...], "file_id": str|None}, от давно использованных к недавним
+        self.data_version, self._index = self._load_index()
+        self._bytes = sum(os.path.getsize(p) for p in self._files())
+        if data_version is not None and data_version != self.data_version:
+            # Данные перезагружали, пока бот был выключен: старые графики и file_id не годятся
+            for key in list(self._index) + [os.path.basename(p)[:-len(".img")] for p in self._files()]:
+                self._remove(key)
+            self.data_version = data_version
+            self._save_index()
+
+    def set_data_version(self, version):
+        # После точечной инвалидации: следующий запуск не станет чистить кэш заново
+        with self._lock:
+            self.data_version = version
+            self._save_index()
+
+    def get_file_id(self, key):
+        with self._lock:
+            file_id = self._index.get(key, {}).get("file_id")
+            if file_id:
+                self.hits["file_id"] += 1
+                self._touch(key)
+            return file_id
+
+    def set_file_id(self, key, file_id, tickers=None):
+        with self._lock:
+            entry = self._index.setdefault(key, {"tickers": []})
+            entry["file_id"] = file_id
+            if tickers is not None:
+                entry["tickers"] = list(normalize_tickers(tickers))
+            self._touch(key)
+            self._prune()
+            self._save_index()
+
+    def forget_file_id(self, key):
+        with self._lock:
+            if key in self._index:
+                self._index[key]["file_id"] = None
+                self._save_index()
+
+    def get_bytes(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            try:
+                os.utime(path)  # для вытеснения по давности использования
+            except FileNotFoundError:
+                pass  # файл успели вытеснить — прочитанные байты всё равно годятся
+            self.hits["disk"] += 1
+            self._touch(key)
+        return data
+
+    def put_bytes(self, key, data, tickers=None):
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp, path)
+            self._bytes += len(data) - old_size
+            self._index.setdefault(key, {"file_id": None})["tickers"] = list(normalize_tickers(tickers))
+            self._touch(key)
+            self._evict()
+            self._prune()
+            self._save_index()
+
+    def invalidate(self, tickers=None):
+        with self._lock:
+            changed = set(normalize_tickers(tickers)) if tickers is not None else None
+            for key, entry in list(self._index.items()):
+                # Пустой список — график по всем тикерам, его задевает любое изменение
+                if changed is None or not entry.get("tickers") or changed.intersection(entry["tickers"]):
+                    self._remove(key)
+            self._save_index()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "file_id_hits": self.hits["file_id"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+            }
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.img")
+
+    def _files(self):
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".img")
+        ]
+
+    def _remove(self, key, keep_file_id=False):
+        entry = self._index.get(key)
+        # Если картинка уже у Telegram, запись оставляем: повторная отправка обойдётся без файла
+        if not (keep_file_id and entry and entry.get("file_id")):
+            self._index.pop(key, None)
+        path = self._path(key)
+        try:
+            self._bytes -= os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _touch(self, key):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._index[key] = entry
+
+    def _prune(self):
+        # Индекс растёт и за счёт записей без файлов — ограничиваем число записей
+        while len(self._index) > self.max_entries:
+            self._remove(next(iter(self._index)))
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        files = sorted(self._files(), key=os.path.getmtime)
+        for path in files:
+            if self._bytes <= self.max_bytes:
+                break
+            self._remove(os.path.basename(path)[:-len(".img")], keep_file_id=True)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None, {}
+        if "entries" not in saved:
+            # Индекс старого формата, без версии данных
+            return None, saved
+        return saved.get("data_version"), saved["entries"]
+
+    def _save_index(self):
+        tmp = f"{self._index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"data_version": self.data_version, "entries": self._index}, f, separators=(",", ":"))
+        os.replace(tmp, self._index_path)
@@ -0,0 +1,230 @@
+# chart_render.py
+import io
+import os
+import threading
+
+import matplotlib.dates as mdates
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+from analysis import plot_price_chart, plot_returns_histogram, plot_volatility_chart
+from comparison import correlation_matrix, plot_correlation_heatmap
+
+CHART_RENDER_MODE = os.getenv("CHART_RENDER_MODE", "classic")  # classic | fast
+CHART_DPI = int(os.getenv("CHART_DPI", "100"))
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png")  # png | png8 | webp
+CHART_WEBP_QUALITY = int(os.getenv("CHART_WEBP_QUALITY", "80"))
+
+FORMATS = ("png", "png8", "webp")
+
+
+def render_signature(mode=CHART_RENDER_MODE, dpi=CHART_DPI, fmt=CHART_FORMAT):
+    # Входит в ключ кэша графиков: другие настройки — другая картинка
+    return f"{mode}-{dpi}-{fmt}"
+
+
+# -------------------------------------------------------
+#  Кодирование картинки
+# -------------------------------------------------------
+
+def _encode_image(image, fmt):
+    buf = io.BytesIO()
+    if fmt == "png8":
+        # Палитра на 256 цветов: для линий и заливок графиков разницы не видно
+        image.convert("RGB").quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(buf, format="PNG", optimize=True)
+    elif fmt == "webp":
+        image.convert("RGB").save(buf, format="WEBP", quality=CHART_WEBP_QUALITY, method=4)
+    else:
+        image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _encode_figure(fig, dpi, fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат графика: {fmt}")
+    fig.set_dpi(dpi)
+    canvas = fig.canvas
+    if fmt == "png":
+        buf = io.BytesIO()
+        canvas.print_png(buf)
+        return buf.getvalue()
+    canvas.draw()
+    image = Image.frombuffer("RGBA", canvas.get_width_height(), canvas.buffer_rgba(), "raw", "RGBA", 0, 1)
+    return _encode_image(image, fmt)
+
+
+# -------------------------------------------------------
+#  Шаблоны фигур (по одному набору на поток)
+# -------------------------------------------------------
+
+class _LineTemplate:
+
+    def __init__(self, title, ylabel, figsize=(12, 6)):
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.ax.set_title(title)
+        self.ax.set_xlabel("Дата")
+        self.ax.set_ylabel(ylabel)
+        self.ax.grid(True)
+        self.ax.xaxis_date()
+        # Поля подобраны один раз вместо tight_layout на каждом вызове
+        self.fig.subplots_adjust(left=0.07, right=0.98, top=0.93, bottom=0.09)
+        self.lines = []
+
+    def draw(self, series, title=None):
+        for i, (x, y, label) in enumerate(series):
+            # Цвет — по номеру линии, а не из цикла осей, который помнит прошлые вызовы
+            color = f"C{i % 10}"
+            if i < len(self.lines):
+                line = self.lines[i]
+                line.set_data(x, y)
+                line.set_label(label)
+                line.set_color(color)
+            else:
+                line, = self.ax.plot(x, y, label=label, color=color)
+                self.lines.append(line)
+        # Лишние линии удаляем, а не прячем: скрытые учитывает legend(loc="best"),
+        # и одна и та же выборка рисовалась бы по-разному в зависимости от прошлых вызовов
+        for line in self.lines[len(series):]:
+            line.remove()
+        del self.lines[len(series):]
+        if title is not None:
+            self.ax.set_title(title)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.legend(handles=self.lines)
+        return self.fig
+
+
+class _HistTemplate:
+
+    def __init__(self, figsize=(10, 6)):
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.ax.set_title("Распределение дневных доходностей")
+        self.ax.set_xlabel("Доходность (изменение цены за день)")
+        self.ax.set_ylabel("Частота")
+        self.ax.grid(True)
+        self.fig.subplots_adjust(left=0.08, right=0.98, top=0.93, bottom=0.09)
+
+    def draw(self, series, bins):
+        # Столбики гистограммы нельзя обновить на месте — пересоздаём только их
+        for patch in list(self.ax.patches):
+            patch.remove()
+        self.ax.containers.clear()
+        self.ax.set_prop_cycle(None)
+        for returns, label in series:
+            self.ax.hist(returns, bins=bins, alpha=0.6, label=label)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.legend()
+        return self.fig
+
+
+_templates = threading.local()
+
+
+def _template(kind):
+    cache = getattr(_templates, "figures", None)
+    if cache is None:
+        cache = _templates.figures = {}
+    if kind not in cache:
+        if kind == "price":
+            cache[kind] = _LineTemplate("Динамика цен акций", "Цена закрытия")
+        elif kind == "volatility":
+            cache[kind] = _LineTemplate("Динамика волатильности акций", "Стандартное отклонение доходности")
+        else:
+            cache[kind] = _HistTemplate()
+    return cache[kind]
+
+
+# -------------------------------------------------------
+#  Быстрая отрисовка
+# -------------------------------------------------------
+
+def _render_price_fast(df):
+    series = []
+    for ticker, group in df.groupby("Ticker"):
+        series.append((
+            mdates.date2num(group["Date"].to_numpy()),
+            group["Close"].to_numpy(),
+            f"{group['Brand_Name'].iloc[0]} ({ticker})",
+        ))
+    title = f"Динамика цен акций {', '.join(list(df.Brand_Name.unique()))}"
+    return _template("price").draw(series, title=title)
+
+
+def _render_volatility_fast(df, window=10):
+    series = []
+    for ticker, group in df.groupby("Ticker"):
+        group = group.sort_values("Date")
+        rolling_vol = group["Close"].pct_change().rolling(window=window).std()
+        series.append((
+            mdates.date2num(group["Date"].to_numpy()),
+            rolling_vol.to_numpy(),
+            f"{ticker} ({window}-дн. волатильность)",
+        ))
+    return _template("volatility").draw(series)
+
+
+def _render_returns_fast(df, bins=30):
+    series = [
+        (group["Close"].pct_change().dropna().to_numpy(), ticker)
+        for ticker, group in df.groupby("Ticker")
+    ]
+    return _template("returns").draw(series, bins=bins)
+
+
+def _render_correlation_fast(df):
+    # Размер матрицы зависит от числа тикеров, поэтому фигура каждый раз своя
+    corr = correlation_matrix(df)
+    size = max(6, min(16, 0.45 * len(corr) + 3))
+    fig = Figure(figsize=(size, size * 0.85))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    image = ax.imshow(corr.to_numpy(), cmap="RdYlGn", vmin=-1, vmax=1)
+    fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04)
+    ax.set_xticks(range(len(corr)), corr.columns, rotation=90)
+    ax.set_yticks(range(len(corr)), corr.index)
+    if len(corr) <= 12:
+        for (i, j), value in np.ndenumerate(corr.to_numpy()):
+            if value == value:
+                ax.text(j, i, f"{value:.2f}", ha="center", va="center", fontsize=8)
+    ax.set_title("Корреляция дневных доходностей")
+    fig.tight_layout()
+    return fig
+
+
+_FAST = {
+    "price": _render_price_fast,
+    "returns": _render_returns_fast,
+    "volatility": _render_volatility_fast,
+    "correlation": _render_correlation_fast,
+}
+
+_CLASSIC = {
+    "price": plot_price_chart,
+    "returns": plot_returns_histogram,
+    "volatility": plot_volatility_chart,
+    "correlation": plot_correlation_heatmap,
+}
+
+
+# Классические plot_* работают через pyplot, а у него одна «текущая фигура» на процесс:
+# из нескольких потоков обработчиков рисуем по очереди
+_pyplot_lock = threading.Lock()
+
+
+def render_chart(kind, df, mode=CHART_RENDER_MODE, dpi=CHART_DPI, fmt=CHART_FORMAT, **params):
+    if mode == "fast":
+        return _encode_figure(_FAST[kind](df, **params), dpi, fmt)
+
+    with _pyplot_lock:
+        data = _CLASSIC[kind](df, dpi=dpi, **params).getvalue()
+    if fmt == "png":
+        return data
+    return _encode_image(Image.open(io.BytesIO(data)), fmt)
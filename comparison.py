@@ -0,0 +1,210 @@
+# comparison.py
+import io
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+TRADING_DAYS = 252
+# Сколько самых сильных пар корреляции показывать в тексте
+TOP_PAIRS = 10
+
+
+def price_matrix(df: pd.DataFrame, field="Close"):
+    # Один разворот в матрицу дата × тикер; дни, когда тикер не торговался, — NaN
+    df = df.drop_duplicates(["Date", "Ticker"], keep="last")
+    matrix = df.pivot(index="Date", columns="Ticker", values=field).sort_index()
+    return matrix.astype(np.float64)
+
+
+def _returns(prices):
+    # Доходность считаем только между соседними днями, где есть обе цены
+    returns = np.full(prices.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = prices[1:] / prices[:-1] - 1
+    return returns
+
+
+def _pairwise_corr(returns, min_periods=3):
+    # Корреляция по попарно общим дням через матричные произведения:
+    # то же, что DataFrame.corr(), но без цикла по парам
+    mask = ~np.isnan(returns)
+    m = mask.astype(np.float64)
+    x = np.where(mask, returns, 0.0)
+    n = m.T @ m
+    sx = x.T @ m            # [i, j]: сумма r_i по дням, где есть и i, и j
+    sxx = (x * x).T @ m
+    sxy = x.T @ x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_x = sxx - sx * sx / n
+        var_y = sxx.T - sx.T * sx.T / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[n < min_periods] = np.nan
+    np.fill_diagonal(corr, np.where(np.diag(n) >= min_periods, 1.0, np.nan))
+    return np.clip(corr, -1.0, 1.0)
+
+
+def _column_beta(returns, market):
+    # beta_i = cov(r_i, r_m) / var(r_m) по дням, где есть и тикер, и индекс
+    mask = ~np.isnan(returns) & ~np.isnan(market)[:, None]
+    n = mask.sum(axis=0)
+    x = np.where(mask, returns, 0.0)
+    y = np.where(mask, market[:, None], 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mx = x.sum(axis=0) / n
+        my = y.sum(axis=0) / n
+        cov = ((x - mx) * (y - my) * mask).sum(axis=0)
+        var = ((y - my) ** 2 * mask).sum(axis=0)
+        beta = cov / var
+    beta[n < 3] = np.nan
+    return beta
+
+
+def _max_drawdown(prices):
+    # Пик считаем с пропуском NaN, просадка — от последнего пика
+    peaks = np.fmax.accumulate(prices, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = prices / peaks - 1
+    return np.nanmin(np.where(np.isnan(drawdown), 0.0, drawdown), axis=0)
+
+
+def _first_last(prices):
+    valid = ~np.isnan(prices)
+    has = valid.any(axis=0)
+    first = np.argmax(valid, axis=0)
+    last = len(prices) - 1 - np.argmax(valid[::-1], axis=0)
+    cols = np.arange(prices.shape[1])
+    start = np.where(has, prices[first, cols], np.nan)
+    end = np.where(has, prices[last, cols], np.nan)
+    return start, end
+
+
+def correlation_matrix(df: pd.DataFrame):
+    matrix = price_matrix(df)
+    corr = _pairwise_corr(_returns(matrix.to_numpy()))
+    return pd.DataFrame(corr, index=matrix.columns, columns=matrix.columns)
+
+
+def compute_comparison(df: pd.DataFrame, trading_days=TRADING_DAYS):
+
+    if df.empty:
+        return None
+
+    matrix = price_matrix(df)
+    tickers = [str(t) for t in matrix.columns]
+    prices = matrix.to_numpy()
+    returns = _returns(prices)
+
+    # Равновзвешенный индекс: средняя доходность тикеров, торговавшихся в этот день
+    counts = (~np.isnan(returns)).sum(axis=1)
+    with np.errstate(invalid="ignore"):
+        market = np.where(counts > 0, np.nansum(returns, axis=1) / np.maximum(counts, 1), np.nan)
+
+    n = (~np.isnan(returns)).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.nansum(returns, axis=0) / n
+        std = np.sqrt(np.nansum((returns - mean) ** 2, axis=0) / (n - 1))
+        sharpe = mean / std * np.sqrt(trading_days)
+    std[n < 2] = np.nan
+    sharpe[n < 2] = np.nan
+
+    start, end = _first_last(prices)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = (end / start - 1) * 100
+    beta = _column_beta(returns, market)
+    drawdown = _max_drawdown(prices) * 100
+    corr = _pairwise_corr(returns)
+
+    index_return = np.nanprod(1 + market) - 1 if np.any(~np.isnan(market)) else np.nan
+
+    metrics = {}
+    columns = zip(tickers, change_pct.tolist(), std.tolist(), sharpe.tolist(), beta.tolist(), drawdown.tolist())
+    for ticker, change_, vol, sharpe_, beta_, dd in columns:
+        metrics[ticker] = {
+            "ticker": ticker,
+            "change_pct": change_,
+            "volatility": vol,
+            "sharpe": sharpe_,
+            "beta": beta_,
+            "max_drawdown_pct": dd,
+        }
+
+    return {
+        "tickers": tickers,
+        "start_date": str(matrix.index[0].date()),
+        "end_date": str(matrix.index[-1].date()),
+        "index_change_pct": float(index_return) * 100,
+        "metrics": metrics,
+        "correlation": {t: dict(zip(tickers, row)) for t, row in zip(tickers, corr.tolist())},
+    }
+
+
+def _fmt(value, spec):
+    return "—" if value is None or value != value else format(value, spec)
+
+
+def format_comparison(comparison, top_pairs=TOP_PAIRS):
+    if not comparison:
+        return "Нет данных для сравнения."
+
+    mes = [
+        f"Сравнение {', '.join(comparison['tickers'])} "
+        f"за {comparison['start_date']} — {comparison['end_date']}:\n",
+        f"Равновзвешенный индекс:  {_fmt(comparison['index_change_pct'], '.2f')}%\n",
+    ]
+    ranked = sorted(
+        comparison["metrics"].values(),
+        key=lambda m: -np.inf if m["change_pct"] != m["change_pct"] else m["change_pct"],
+        reverse=True,
+    )
+    for m in ranked:
+        mes.append(
+            f"{m['ticker']}:  изменение {_fmt(m['change_pct'], '.2f')}%, "
+            f"волатильность {_fmt(m['volatility'], '.4f')}, "
+            f"Шарп {_fmt(m['sharpe'], '.2f')}, "
+            f"бета {_fmt(m['beta'], '.2f')}, "
+            f"макс. просадка {_fmt(m['max_drawdown_pct'], '.2f')}%"
+        )
+
+    tickers = comparison["tickers"]
+    corr = comparison["correlation"]
+    pairs = [
+        (corr[a][b], a, b)
+        for i, a in enumerate(tickers) for b in tickers[i + 1:]
+        if corr[a][b] == corr[a][b]
+    ]
+    if pairs:
+        pairs.sort(key=lambda p: abs(p[0]), reverse=True)
+        mes.append("\nКорреляция дневных доходностей:")
+        for value, a, b in pairs[:top_pairs]:
+            mes.append(f"{a} — {b}:  {value:.2f}")
+    return "\n".join(mes)
+
+
+def plot_correlation_heatmap(df: pd.DataFrame, dpi=None):
+    corr = correlation_matrix(df)
+    size = max(6, min(16, 0.45 * len(corr) + 3))
+    plt.figure(figsize=(size, size * 0.85))
+
+    plt.imshow(corr.to_numpy(), cmap="RdYlGn", vmin=-1, vmax=1)
+    plt.colorbar(fraction=0.046, pad=0.04)
+    ticks = np.arange(len(corr))
+    plt.xticks(ticks, corr.columns, rotation=90)
+    plt.yticks(ticks, corr.index)
+    # Подписи значений читаются только на небольших матрицах
+    if len(corr) <= 12:
+        for i in ticks:
+            for j in ticks:
+                value = corr.iat[i, j]
+                if value == value:
+                    plt.text(j, i, f"{value:.2f}", ha="center", va="center", fontsize=8)
+
+    plt.title("Корреляция дневных доходностей")
+    plt.tight_layout()
+
+    buf = io.BytesIO()
+    plt.savefig(buf, format="png", dpi=dpi)
+    plt.close()
+    buf.seek(0)
+    return buf
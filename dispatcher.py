@@ -0,0 +1,143 @@
+# dispatcher.py
+import functools
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+HANDLER_THREADS = int(os.getenv("HANDLER_THREADS", "8"))
+HANDLER_MAX_PENDING = int(os.getenv("HANDLER_MAX_PENDING", "500"))
+RENDER_PROCESSES = int(os.getenv("RENDER_PROCESSES", "0"))  # 0 — рисуем в потоке обработчика
+
+_SAMPLES = 1000
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ChatDispatcher:
+    """Пул потоков для обработчиков: разные чаты параллельно, один чат — строго по порядку."""
+
+    def __init__(self, max_workers=HANDLER_THREADS, max_pending=HANDLER_MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="handler")
+        self._queues = {}  # chat_id -> deque[(fn, args, kwargs, enqueued_at, acquired)]
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._local = threading.local()
+        self.max_pending = max_pending
+        self.pending = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._wait = deque(maxlen=_SAMPLES)
+        self._run = deque(maxlen=_SAMPLES)
+
+    def submit(self, chat_id, fn, *args, **kwargs):
+        # Поток приёма обновлений ждёт свободного места (backpressure);
+        # задачи, поставленные из самих обработчиков, не блокируются
+        acquired = self._slots.acquire(blocking=not getattr(self._local, "worker", False))
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+            queue = self._queues.get(chat_id)
+            start = queue is None
+            if start:
+                queue = self._queues[chat_id] = deque()
+            queue.append((fn, args, kwargs, time.perf_counter(), acquired))
+        if start:
+            self._executor.submit(self._run_next, chat_id)
+
+    def per_chat(self, chat_id_of):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                self.submit(chat_id_of(*args), fn, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _run_next(self, chat_id):
+        with self._lock:
+            fn, args, kwargs, enqueued_at, acquired = self._queues[chat_id].popleft()
+            self.running += 1
+        started = time.perf_counter()
+        self._local.worker = True
+        try:
+            fn(*args, **kwargs)
+            ok = True
+        except Exception:
+            ok = False
+            traceback.print_exc()
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.running -= 1
+                self.pending -= 1
+                self.completed += ok
+                self.failed += not ok
+                self._wait.append(started - enqueued_at)
+                self._run.append(finished - started)
+                queue = self._queues[chat_id]
+                more = bool(queue)
+                if not more:
+                    del self._queues[chat_id]
+            if acquired:
+                self._slots.release()
+        # Следующее сообщение этого чата — отдельной задачей, чтобы не занимать поток надолго
+        if more:
+            self._executor.submit(self._run_next, chat_id)
+
+    def stats(self):
+        with self._lock:
+            wait, run = list(self._wait), list(self._run)
+            return {
+                "queue_depth": self.pending - self.running,
+                "running": self.running,
+                "active_chats": len(self._queues),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "wait_p50": _percentile(wait, 0.5),
+                "wait_p95": _percentile(wait, 0.95),
+                "run_p50": _percentile(run, 0.5),
+                "run_p95": _percentile(run, 0.95),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class RenderPool:
+    """Отрисовка графиков в отдельных процессах: matplotlib держит GIL."""
+
+    def __init__(self, processes=RENDER_PROCESSES):
+        self._executor = None
+        if processes > 0:
+            method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context(method)
+            )
+            # Поднимаем процессы сразу, пока в процессе бота ещё нет рабочих потоков
+            self._executor.submit(os.getpid).result()
+
+    def run(self, fn, *args, **kwargs):
+        if self._executor is None:
+            return fn(*args, **kwargs)
+        try:
+            return self._executor.submit(fn, *args, **kwargs).result()
+        except BrokenProcessPool:
+            traceback.print_exc()
+            self._executor = None
+            return fn(*args, **kwargs)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
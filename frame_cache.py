@@ -0,0 +1,100 @@
+# frame_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+FRAME_CACHE_MAX_ENTRIES = int(os.getenv("FRAME_CACHE_MAX_ENTRIES", "256"))
+FRAME_CACHE_TTL = float(os.getenv("FRAME_CACHE_TTL", "900"))
+
+
+def normalize_tickers(tickers):
+    if not tickers:
+        return ()
+    if isinstance(tickers, str):
+        tickers = [tickers]
+    return tuple(sorted({t.strip().upper() for t in tickers if t}))
+
+
+def make_key(tickers, start_date=None, end_date=None):
+    return (normalize_tickers(tickers), start_date or None, end_date or None)
+
+
+class FrameCache:
+    """LRU-кэш DataFrame'ов с TTL и ограничением по занимаемой памяти."""
+
+    def __init__(self, max_bytes=FRAME_CACHE_MAX_BYTES, max_entries=FRAME_CACHE_MAX_ENTRIES, ttl=FRAME_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (df, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            df, size, expires_at = item
+            if expires_at <= now:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return df
+
+    def put(self, key, df):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (df, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._items and (self._bytes > self.max_bytes or len(self._items) > self.max_entries):
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        df = self.get(key)
+        if df is None:
+            df = loader()
+            if df is not None and not df.empty:
+                self.put(key, df)
+        return df
+
+    def invalidate(self, tickers=None):
+        with self._lock:
+            if tickers is None:
+                self._items.clear()
+                self._bytes = 0
+                return
+            changed = set(normalize_tickers(tickers))
+            # Пустой кортеж — выборка по всем тикерам, её задевает любое изменение
+            for key in [k for k in self._items if not k[0] or changed.intersection(k[0])]:
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _drop(self, key):
+        _, size, _ = self._items.pop(key)
+        self._bytes -= size
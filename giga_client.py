@@ -0,0 +1,201 @@
+# giga_client.py
+import os
+import random
+import threading
+import time
+
+import httpx
+from gigachat import GigaChat
+from gigachat.api import post_chat
+from gigachat.client import _parse_chat
+from gigachat.exceptions import AuthenticationError, ResponseError
+
+# Адреса API берутся из GIGACHAT_BASE_URL / GIGACHAT_AUTH_URL (настройки самой библиотеки),
+# так клиента можно направить на локальный stub-сервер
+GIGACHAT_TIMEOUT = float(os.getenv("GIGACHAT_TIMEOUT", "20"))
+GIGACHAT_MAX_CONNECTIONS = int(os.getenv("GIGACHAT_MAX_CONNECTIONS", "10"))
+GIGACHAT_MAX_RETRIES = int(os.getenv("GIGACHAT_MAX_RETRIES", "2"))
+GIGACHAT_BACKOFF_BASE = float(os.getenv("GIGACHAT_BACKOFF_BASE", "0.5"))
+GIGACHAT_BACKOFF_MAX = float(os.getenv("GIGACHAT_BACKOFF_MAX", "4"))
+GIGACHAT_RETRY_BUDGET = float(os.getenv("GIGACHAT_RETRY_BUDGET", "0.2"))
+GIGACHAT_BREAKER_FAILURES = int(os.getenv("GIGACHAT_BREAKER_FAILURES", "5"))
+GIGACHAT_BREAKER_COOLDOWN = float(os.getenv("GIGACHAT_BREAKER_COOLDOWN", "30"))
+GIGACHAT_TOKEN_REFRESH_MARGIN = float(os.getenv("GIGACHAT_TOKEN_REFRESH_MARGIN", "120"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RetryBudget:
+    """Повторы не больше заданной доли от числа вызовов (token bucket)."""
+
+    def __init__(self, ratio=GIGACHAT_RETRY_BUDGET, min_tokens=3.0, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """После серии ошибок перестаёт ходить в API на время cooldown."""
+
+    def __init__(self, failures=GIGACHAT_BREAKER_FAILURES, cooldown=GIGACHAT_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._errors = 0
+        self._opened_at = None
+        self._probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return "open"
+            return "half-open"
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown or self._probe:
+                raise CircuitOpenError("GigaChat временно недоступен")
+            # half-open: пропускаем один пробный запрос
+            self._probe = True
+
+    def on_success(self):
+        with self._lock:
+            self._errors = 0
+            self._opened_at = None
+            self._probe = False
+
+    def on_failure(self):
+        with self._lock:
+            self._errors += 1
+            if self._probe or self._errors >= self.failures:
+                self._opened_at = time.monotonic()
+            self._probe = False
+
+
+def _is_retryable(error):
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, ResponseError) and not isinstance(error, AuthenticationError):
+        status = error.args[1] if len(error.args) > 1 else None
+        return status in RETRY_STATUSES
+    return False
+
+
+class _AttemptClient:
+    """Общий httpx.Client с таймаутом одной попытки; сам клиент не меняем — он общий для потоков."""
+
+    __slots__ = ("client", "timeout")
+
+    def __init__(self, client, timeout):
+        self.client = client
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.client.request(*args, **kwargs)
+
+
+class GigaClient:
+    """Долгоживущий клиент GigaChat: один HTTP-пул и один OAuth-токен на процесс."""
+
+    def __init__(self, credentials, timeout=GIGACHAT_TIMEOUT, max_retries=GIGACHAT_MAX_RETRIES,
+                 budget=None, breaker=None, **giga_kwargs):
+        giga_kwargs.setdefault("verify_ssl_certs", False)
+        giga_kwargs.setdefault("max_connections", GIGACHAT_MAX_CONNECTIONS)
+        self._giga = GigaChat(credentials=credentials, timeout=timeout, **giga_kwargs)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self._token_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _refresh_token(self):
+        # Библиотека обновляет токен только после 401 — обновляем заранее
+        with self._token_lock:
+            token = self._giga._access_token
+            if token is not None and token.expires_at:
+                expires_in = token.expires_at / 1000 - time.time()
+                if expires_in > GIGACHAT_TOKEN_REFRESH_MARGIN:
+                    return
+                self._giga._reset_token()
+            elif token is not None:
+                return
+            self._giga.get_token()
+
+    def chat(self, payload, deadline=None):
+        # deadline — общий лимит времени на вызов вместе с повторами, секунды
+        self.breaker.before_call()
+        self.budget.deposit()
+        with self._stats_lock:
+            self.calls += 1
+        chat = _parse_chat(payload, self._giga._settings)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                self._refresh_token()
+                response = self._attempt(chat, started, deadline)
+                self.breaker.on_success()
+                return response
+            except Exception as e:
+                retryable = _is_retryable(e)
+                if retryable:
+                    self.breaker.on_failure()
+                else:
+                    # Ответ с ошибкой запроса — сам API при этом жив
+                    self.breaker.on_success()
+                delay = min(GIGACHAT_BACKOFF_MAX, GIGACHAT_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+                out_of_time = deadline is not None and time.monotonic() - started + delay > deadline
+                if (not retryable or attempt >= self.max_retries or out_of_time
+                        or self.breaker.state != "closed" or not self.budget.withdraw()):
+                    with self._stats_lock:
+                        self.failures += 1
+                    raise
+                attempt += 1
+                with self._stats_lock:
+                    self.retries += 1
+                time.sleep(delay)
+
+    def _attempt(self, chat, started, deadline):
+        # Одна попытка не дольше, чем осталось от общего лимита
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - (time.monotonic() - started), 0.1))
+        client = _AttemptClient(self._giga._client, timeout)
+        return self._giga._decorator(
+            lambda: post_chat.sync(client, chat=chat, access_token=self._giga.token)
+        )
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {"calls": self.calls, "retries": self.retries, "failures": self.failures}
+        stats["breaker"] = self.breaker.state
+        return stats
+
+    def close(self):
+        self._giga.close()
@@ -1,10 +1,57 @@
 # gigachat_promt.py
-from gigachat import GigaChat
+import hashlib
+import json
+import threading
 from gigachat.models import Chat, Messages, MessagesRole
 from config.config import GIGACHAT_CLIENT_SECRET
+from giga_client import GigaClient
+from llm_cache import LLMCache, LLM_CACHE_PATH, LLM_CACHE_PARSE_TTL, LLM_CACHE_ANALYSIS_TTL, normalize_message, stats_key
 from prompts import PARSE_PROMPT
 
-def _call_giga(system_prompt: str, user_prompt: str, temperature: float = 0.0, max_tokens: int = 500):
+_client = None
+_client_lock = threading.Lock()
+_cache = None
+_cache_ready = False
+
+
+def get_giga_client() -> GigaClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GigaClient(credentials=GIGACHAT_CLIENT_SECRET)
+        return _client
+
+
+def get_llm_cache():
+    global _cache, _cache_ready
+    with _client_lock:
+        if not _cache_ready:
+            _cache_ready = True
+            if LLM_CACHE_PATH:
+                try:
+                    _cache = LLMCache()
+                except Exception as e:
+                    print(f"Кэш ответов GigaChat недоступен: {e}")
+        return _cache
+
+
+def giga_stats():
+    # Плоский словарь для метрик; клиента и кэш ради этого не создаём
+    stats = {}
+    client, cache = _client, _cache
+    if client is not None:
+        for name, value in client.stats().items():
+            stats[f"giga_{name}"] = value
+        stats["giga_breaker_open"] = int(client.breaker.state != "closed")
+    if cache is not None:
+        cache_stats = cache.stats()
+        for kind in ("rows", "hits", "misses"):
+            for namespace, value in cache_stats[kind].items():
+                stats[f"llm_cache_{kind}_{namespace}"] = value
+    return stats
+
+
+def _call_giga(system_prompt: str, user_prompt: str, temperature: float = 0.0, max_tokens: int = 500, deadline: float = None):
 
     payload = Chat(
         messages=[
@@ -15,8 +62,7 @@ def _call_giga(system_prompt: str, user_prompt: str, temperature: float = 0.0, m
         max_tokens=max_tokens,
     )
 
-    with GigaChat(credentials=GIGACHAT_CLIENT_SECRET, verify_ssl_certs=False) as giga:
-        response = giga.chat(payload)
+    response = get_giga_client().chat(payload, deadline=deadline)
 
     return response.choices[0].message.content
 
@@ -25,9 +71,25 @@ def _call_giga(system_prompt: str, user_prompt: str, temperature: float = 0.0, m
 # ----------------------------------------------------------
 
 def parse_user_query_with_giga(parse_prompt_template: str, user_message: str) -> str:
+    cache = get_llm_cache()
+    template_hash = hashlib.sha256(parse_prompt_template.encode("utf-8")).hexdigest()[:12]
+    cache_key = f"{template_hash}:{normalize_message(user_message)}"
+    if cache is not None:
+        cached = cache.get("parse", cache_key)
+        if cached is not None:
+            return cached
+
     user_prompt = f"{parse_prompt_template}\n\nЗапрос пользователя:\n\"\"\"{user_message}\"\"\""
     system_prompt = "Ты — модель, которая строго преобразует пользовательские фразы в JSON по заданным правилам."
-    result = _call_giga(system_prompt=system_prompt, user_prompt=user_prompt, temperature=0.0, max_tokens=500)
+    result = _call_giga(system_prompt=system_prompt, user_prompt=user_prompt, temperature=0.0, max_tokens=500, deadline=15)
+
+    # Кэшируем только ответы, которые бот сможет разобрать
+    if cache is not None:
+        try:
+            json.loads(result.strip().strip('`'))
+            cache.put("parse", cache_key, result, LLM_CACHE_PARSE_TTL)
+        except ValueError:
+            pass
     return result
 
 
@@ -37,6 +99,13 @@ def parse_user_query_with_giga(parse_prompt_template: str, user_message: str) ->
 
 def generate_analysis_with_giga(stats_dict: dict) -> str:
 
+    cache = get_llm_cache()
+    cache_key = stats_key(stats_dict)
+    if cache is not None:
+        cached = cache.get("analysis", cache_key)
+        if cached is not None:
+            return cached
+
     system_prompt = (
         "Ты — финансовый аналитик. Дай краткий вывод по статистике цен "
         "акций за период. Максимум 5-7 предложений. Без списков и сухих данных. Если компаний несколько, сравни их данные между собой"
@@ -51,9 +120,12 @@ def generate_analysis_with_giga(stats_dict: dict) -> str:
         system_prompt=system_prompt,
         user_prompt=user_prompt,
         temperature=0.4,
-        max_tokens=500
+        max_tokens=500,
+        deadline=40
     )
 
+    if cache is not None:
+        cache.put("analysis", cache_key, result, LLM_CACHE_ANALYSIS_TTL)
     return result
 
 # ----------------------------------------------------------
@@ -74,6 +146,7 @@ def response_with_giga(user_message: str) -> str:
         system_prompt=system_prompt,
         user_prompt=user_prompt,
         temperature=0.5,
-        max_tokens=250  # достаточно для 1-2 предложений
+        max_tokens=250,  # достаточно для 1-2 предложений
+        deadline=15
     )
     return result.strip()
\ No newline at end of file
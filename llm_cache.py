@@ -0,0 +1,122 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3")  # пустая строка — без кэша
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "20000"))
+LLM_CACHE_PARSE_TTL = float(os.getenv("LLM_CACHE_PARSE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_ANALYSIS_TTL = float(os.getenv("LLM_CACHE_ANALYSIS_TTL", str(24 * 3600)))
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+# Файлы с текстами промптов: их изменение сбрасывает кэш
+PROMPT_FILES = ("prompts.py", "gigachat_promt.py")
+
+
+def prompt_version():
+    digest = hashlib.sha256()
+    for name in PROMPT_FILES:
+        with open(os.path.join(_HERE, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def normalize_message(text):
+    text = text.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s\-]", " ", text)
+    return " ".join(text.split())
+
+
+def _round(value, digits):
+    if isinstance(value, float):
+        return None if value != value else round(value, digits)
+    if isinstance(value, dict):
+        return {str(k): _round(v, digits) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_round(v, digits) for v in value]
+    return value
+
+
+def stats_key(stats, digits=4):
+    # Одинаковая статистика с точностью до округления — один ключ
+    payload = json.dumps(_round(stats, digits), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Кэш ответов GigaChat в SQLite: TTL, лимит строк, сброс при смене промптов."""
+
+    def __init__(self, path=LLM_CACHE_PATH, max_rows=LLM_CACHE_MAX_ROWS, version=None):
+        self.max_rows = max_rows
+        self.version = version or prompt_version()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, version TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used)")
+        # Ответы на старые промпты больше не нужны
+        self._conn.execute("DELETE FROM llm_cache WHERE version != ? OR expires_at < ?", (self.version, time.time()))
+        self.hits = {}
+        self.misses = {}
+        self._puts = 0
+
+    def get(self, namespace, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_cache WHERE namespace = ? AND key = ? AND version = ? AND expires_at > ?",
+                (namespace, key, self.version, now),
+            ).fetchone()
+            if row is None:
+                self.misses[namespace] = self.misses.get(namespace, 0) + 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_used = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+            )
+            self.hits[namespace] = self.hits.get(namespace, 0) + 1
+            return row[0]
+
+    def put(self, namespace, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (namespace, key, version, value, expires_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, self.version, value, now + ttl, now),
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._trim(now)
+
+    def _trim(self, now):
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE rowid IN ("
+            " SELECT rowid FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def clear(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM llm_cache")
+            else:
+                self._conn.execute("DELETE FROM llm_cache WHERE namespace = ?", (namespace,))
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT namespace, COUNT(*) FROM llm_cache GROUP BY namespace").fetchall()
+            return {
+                "rows": dict(rows),
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "version": self.version,
+            }
@@ -1,38 +1,290 @@
+import argparse
+import io
+import json
+import os
+import time
+
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.types import TIMESTAMP, FLOAT, VARCHAR
+from sqlalchemy import create_engine, text
 from config.config import DATABASE_URL
+from change_listener import CHANGES_CHANNEL
+from snapshot import SNAPSHOT_DIR, SNAPSHOT_FORMAT, write_snapshot
+from summaries import SUMMARY_COLUMNS, SUMMARY_DDL, SUMMARY_TABLE, summarize_periods
+
+CSV_PATH = os.getenv("LOADER_CSV", "World-Stock-Prices-Dataset.csv")
+# Через запятую; "*" — без фильтра
+LOADER_YEARS = os.getenv("LOADER_YEARS", "2024")
+LOADER_INDUSTRIES = os.getenv("LOADER_INDUSTRIES", "technology")
+CHUNK_ROWS = int(os.getenv("LOADER_CHUNK_ROWS", "200000"))
+
+# Колонки, которые читаем из CSV, и их типы
+CSV_DTYPES = {
+    'Date': 'string',
+    'Open': 'float64',
+    'High': 'float64',
+    'Low': 'float64',
+    'Close': 'float64',
+    'Volume': 'float64',
+    'Brand_Name': 'string',
+    'Ticker': 'string',
+    'Industry_Tag': 'category',
+    'Country': 'category',
+}
+TABLE_COLUMNS = list(CSV_DTYPES)
 
-df = pd.read_csv('World-Stock-Prices-Dataset.csv')
-filter_df = df[(df['Date'].str.split('-').str[0] == '2024') & (df['Industry_Tag'] == 'technology')]
-
-engine_url = DATABASE_URL
-engine = create_engine(engine_url)
-  
-
-# Загружаем DataFrame в PostgreSQL
-filter_df.to_sql(
-    name='stock_data' ,
-    con=engine,
-    if_exists='replace',
-    index=False,
-    dtype={
-        'Date': TIMESTAMP,
-        'Open': FLOAT,
-        'High': FLOAT,
-        'Low': FLOAT,
-        'Close': FLOAT,
-        'Volume': FLOAT,
-        'Brand_Name': VARCHAR(255),
-        'Ticker': VARCHAR(50),
-        'Industry_Tag': VARCHAR(255),
-        'Country': VARCHAR(100),
-        'Dividends': FLOAT,
-        'Stock Splits': FLOAT,
-        'Capital Gains': FLOAT
-    }
+TABLE_DDL = '''
+CREATE TABLE {table} (
+    "Date" TIMESTAMP,
+    "Open" FLOAT,
+    "High" FLOAT,
+    "Low" FLOAT,
+    "Close" FLOAT,
+    "Volume" FLOAT,
+    "Brand_Name" VARCHAR(255),
+    "Ticker" VARCHAR(50),
+    "Industry_Tag" VARCHAR(255),
+    "Country" VARCHAR(100)
 )
+'''
+
+
+def _parse_filter(value):
+    value = value.strip()
+    if value in ("", "*"):
+        return None
+    return [v.strip().lower() for v in value.split(",") if v.strip()]
+
+
+def iter_chunks(path=CSV_PATH, years=LOADER_YEARS, industries=LOADER_INDUSTRIES, chunk_rows=CHUNK_ROWS):
+    # Читаем CSV кусками: в памяти одновременно не больше chunk_rows строк
+    years = _parse_filter(years)
+    industries = _parse_filter(industries)
+    for chunk in pd.read_csv(path, usecols=TABLE_COLUMNS, dtype=CSV_DTYPES, chunksize=chunk_rows):
+        read = len(chunk)
+        mask = pd.Series(True, index=chunk.index)
+        if years is not None:
+            mask &= chunk['Date'].str[:4].isin(years)
+        if industries is not None:
+            mask &= chunk['Industry_Tag'].astype('string').str.lower().isin(industries)
+        # Тикеры в верхнем регистре, чтобы бот искал по индексу без upper()
+        chunk = chunk.loc[mask, TABLE_COLUMNS]
+        yield read, chunk.assign(Ticker=chunk['Ticker'].str.upper())
+
+
+def copy_frame(cursor, df, table, columns=TABLE_COLUMNS):
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    columns = ", ".join(f'"{c}"' for c in columns)
+    cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def create_indexes(cursor, table='stock_data', name='stock_data'):
+    # Уникальный индекс под выборки бота (тикер + диапазон дат) и под upsert
+    cursor.execute(f'DROP INDEX IF EXISTS ix_{name}_ticker_date')
+    cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS ux_{name}_ticker_date ON {table} ("Ticker", "Date")')
+
+
+def _dedupe(cursor, table):
+    # В исходном CSV встречаются повторы (Ticker, Date) — оставляем последнюю строку
+    cursor.execute(
+        f'DELETE FROM {table} a USING {table} b '
+        f'WHERE a.ctid < b.ctid AND a."Ticker" = b."Ticker" AND a."Date" = b."Date"'
+    )
+
+
+def _notify(cursor, mode, tickers=None, start=None, end=None):
+    # Уведомление для бота (LISTEN stock_data_changed); доставляется после COMMIT
+    payload = {"mode": mode, "tickers": sorted(tickers) if tickers is not None else None,
+               "start": start, "end": end}
+    message = json.dumps(payload, ensure_ascii=False)
+    if len(message) > 7000:
+        # Лимит NOTIFY — 8000 байт; без списка бот сбросит все кэши
+        message = json.dumps({**payload, "tickers": None}, ensure_ascii=False)
+    cursor.execute("SELECT pg_notify(%s, %s)", (CHANGES_CHANNEL, message))
+
+
+def _copy_chunks(cursor, chunks, table, started, keep=None):
+    rows_read = rows_loaded = 0
+    tickers = set()
+    dates = []
+    for read, chunk in chunks:
+        rows_read += read
+        if keep is not None:
+            chunk = keep(chunk)
+        if not chunk.empty:
+            copy_frame(cursor, chunk, table)
+            rows_loaded += len(chunk)
+            tickers.update(chunk['Ticker'].unique())
+            dates += [chunk['Date'].str[:10].min(), chunk['Date'].str[:10].max()]
+        elapsed = time.perf_counter() - started
+        print(f"Прочитано {rows_read} строк, загружено {rows_loaded} "
+              f"({rows_read / elapsed:,.0f} строк/с)")
+    return rows_loaded, tickers, (min(dates) if dates else None), (max(dates) if dates else None)
+
+
+def load(engine, path=CSV_PATH, table='stock_data', notify=True):
+    # Полная перезагрузка: строим staging-таблицу рядом и подменяем одним переименованием,
+    # бот всё это время читает старые данные
+    started = time.perf_counter()
+    staging = f"{table}_staging"
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(TABLE_DDL.format(table=staging))
+        rows_loaded, _, start, end = _copy_chunks(cursor, iter_chunks(path), staging, started)
+        _dedupe(cursor, staging)
+        create_indexes(cursor, staging, name=staging)
+        raw.commit()
+
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_old")
+        cursor.execute(f"ALTER TABLE IF EXISTS {table} RENAME TO {table}_old")
+        cursor.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_old")
+        cursor.execute(f"ALTER INDEX ux_{staging}_ticker_date RENAME TO ux_{table}_ticker_date")
+        if notify:
+            _notify(cursor, "full", None, start, end)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    print(f"Готово: {rows_loaded} строк в {table} за {time.perf_counter() - started:.1f} с")
+    return rows_loaded
+
+
+def high_water_marks(cursor, table='stock_data'):
+    # Последняя загруженная дата по каждому тикеру (берётся из индекса)
+    cursor.execute(f'SELECT "Ticker", MAX("Date") FROM {table} GROUP BY "Ticker"')
+    return {ticker: pd.Timestamp(last) for ticker, last in cursor.fetchall()}
+
+
+def load_incremental(engine, path=CSV_PATH, table='stock_data', notify=True):
+    # Догружаем только дни после high-water mark тикера и вливаем их одной транзакцией
+    started = time.perf_counter()
+    staging = f"{table}_delta"
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute("SELECT to_regclass(%s)", (f"ux_{table}_ticker_date",))
+        if cursor.fetchone()[0] is None:
+            # Таблица от старой версии загрузчика: без уникального индекса upsert невозможен
+            _dedupe(cursor, table)
+            create_indexes(cursor, table)
+        marks = high_water_marks(cursor, table)
+        raw.commit()
+
+        def only_new(chunk):
+            # Часовой пояс в строке даты Postgres для TIMESTAMP отбрасывает — делаем так же
+            dates = pd.to_datetime(chunk['Date'].str[:19])
+            last = pd.to_datetime(chunk['Ticker'].map(marks))
+            return chunk[last.isna() | (dates > last)]
+
+        cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table}) ON COMMIT DROP")
+        rows_loaded, tickers, start, end = _copy_chunks(cursor, iter_chunks(path), staging, started, keep=only_new)
+        if rows_loaded:
+            _dedupe(cursor, staging)
+            columns = ", ".join(f'"{c}"' for c in TABLE_COLUMNS)
+            updates = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in TABLE_COLUMNS if c not in ('Ticker', 'Date'))
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} '
+                f'ON CONFLICT ("Ticker", "Date") DO UPDATE SET {updates}'
+            )
+            if notify:
+                _notify(cursor, "incremental", tickers, start, end)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    print(f"Готово: {rows_loaded} новых строк в {table} за {time.perf_counter() - started:.1f} с")
+    return rows_loaded
+
+
+def build_summaries(engine, table='stock_data', summary=SUMMARY_TABLE):
+    # Сводки по месяцам, кварталам, полугодиям и году с местами в рейтинге;
+    # бот отвечает на «топ» одним запросом по индексу (period, rank)
+    started = time.perf_counter()
+    staging = f"{summary}_staging"
+    with engine.connect() as conn:
+        df = pd.read_sql(text(f'SELECT "Date", "Ticker", "Brand_Name", "Close" FROM {table}'), conn)
+    frame = summarize_periods(df)
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(SUMMARY_DDL.format(table=staging))
+        copy_frame(cursor, frame, staging, SUMMARY_COLUMNS)
+        cursor.execute(f'ALTER TABLE {staging} ADD CONSTRAINT pk_{staging} PRIMARY KEY ("period", "Ticker")')
+        cursor.execute(f'CREATE INDEX ix_{staging}_period_rank ON {staging} ("period", "rank")')
+        cursor.execute(f"DROP TABLE IF EXISTS {summary}")
+        cursor.execute(f"ALTER TABLE {staging} RENAME TO {summary}")
+        cursor.execute(f"ALTER INDEX pk_{staging} RENAME TO pk_{summary}")
+        cursor.execute(f"ALTER INDEX ix_{staging}_period_rank RENAME TO ix_{summary}_period_rank")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    print(f"Сводки: {len(frame)} строк в {summary} за {time.perf_counter() - started:.1f} с")
+    return len(frame)
+
+
+def export_snapshot(engine, table='stock_data', path=SNAPSHOT_DIR, fmt=SNAPSHOT_FORMAT, notify=True):
+    # Снимок для PRICE_BACKEND=snapshot: по файлу на тикер, читаем из БД тоже по тикеру.
+    # Уведомление — только после подмены снимка, иначе бот перечитает старый
+    started = time.perf_counter()
+    columns = '"Date", "Brand_Name", "Open", "High", "Low", "Close", "Volume"'
+
+    def frames(conn):
+        tickers = [row[0] for row in conn.execute(text(f'SELECT DISTINCT "Ticker" FROM {table}'))]
+        query = text(f'SELECT {columns} FROM {table} WHERE "Ticker" = :ticker ORDER BY "Date"')
+        for ticker in sorted(tickers):
+            yield ticker, pd.read_sql(query, conn, params={"ticker": ticker})
 
+    with engine.connect() as conn:
+        count = write_snapshot(frames(conn), path, fmt)
+    print(f"Снимок {path} ({fmt}): {count} тикеров за {time.perf_counter() - started:.1f} с")
+    if notify and engine.dialect.name == "postgresql":
+        raw = engine.raw_connection()
+        try:
+            _notify(raw.cursor(), "snapshot")
+            raw.commit()
+        finally:
+            raw.close()
+    return count
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Загрузка World-Stock-Prices-Dataset.csv в stock_data")
+    parser.add_argument("--incremental", action="store_true", help="догрузить только новые дни")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--snapshot", action="store_true",
+                        help="после загрузки записать снимок для PRICE_BACKEND=snapshot")
+    parser.add_argument("--snapshot-only", action="store_true", help="только пересобрать снимок")
+    parser.add_argument("--summaries-only", action="store_true", help="только пересобрать сводки и рейтинги")
+    args = parser.parse_args()
 
+    engine = create_engine(DATABASE_URL)
+    if args.summaries_only:
+        build_summaries(engine)
+    elif not args.snapshot_only:
+        # Со снимком бот уведомляет export_snapshot, когда новый снимок уже на месте
+        if args.incremental:
+            loaded = load_incremental(engine, args.csv, notify=not args.snapshot)
+        else:
+            loaded = load(engine, args.csv, notify=not args.snapshot)
+        if loaded:
+            build_summaries(engine)
+    if args.snapshot or args.snapshot_only:
+        export_snapshot(engine)
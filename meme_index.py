@@ -0,0 +1,162 @@
+# meme_index.py
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+
+from PIL import Image, UnidentifiedImageError
+
+MEME_DIR = os.getenv("MEME_DIR", "memes")
+MEME_INDEX_PATH = os.getenv("MEME_INDEX_PATH", ".meme_index.json")  # file_id, выданные Telegram
+MEME_MAX_SIDE = int(os.getenv("MEME_MAX_SIDE", "1280"))  # 0 — не уменьшать; Telegram всё равно ужмёт до 1280
+MEME_JPEG_QUALITY = int(os.getenv("MEME_JPEG_QUALITY", "85"))
+MEME_MAX_CHATS = int(os.getenv("MEME_MAX_CHATS", "10000"))  # чатов с собственной колодой
+
+EXTENSIONS = (".png", ".jpg", ".jpeg")
+# Ограничения Telegram для sendPhoto
+_MAX_PHOTO_BYTES = 10 * 1024 * 1024
+_MAX_DIMENSIONS = 10000
+_MAX_RATIO = 20
+
+
+class Meme:
+    __slots__ = ("name", "key", "data", "file_id")
+
+    def __init__(self, name, key, data, file_id=None):
+        self.name = name
+        self.key = key  # хэш отправляемых байтов: файл заменили — file_id уже не тот
+        self.data = data
+        self.file_id = file_id
+
+
+def prepare_image(raw, max_side=MEME_MAX_SIDE, quality=MEME_JPEG_QUALITY):
+    # Проверка картинки и, если она крупнее нужного, уменьшение с пережатием в JPEG
+    with Image.open(io.BytesIO(raw)) as probe:
+        probe.verify()
+    image = Image.open(io.BytesIO(raw))
+    width, height = image.size
+    if max(width, height) / max(min(width, height), 1) > _MAX_RATIO:
+        raise ValueError(f"соотношение сторон {width}x{height} Telegram не примет")
+    if max_side <= 0 or max(width, height) <= max_side:
+        if len(raw) > _MAX_PHOTO_BYTES or width + height > _MAX_DIMENSIONS:
+            raise ValueError(f"слишком большая картинка ({width}x{height}, {len(raw)} байт)")
+        return raw
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image.mode in ("RGBA", "LA", "P"):
+        # Прозрачность JPEG не умеет — подкладываем белый фон
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, "white")
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    buf = io.BytesIO()
+    image.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+    data = buf.getvalue()
+    # Пережатый файл вышел тяжелее исходного — отправляем исходный
+    return data if len(data) < len(raw) else raw
+
+
+class MemeIndex:
+    """Мемы, проверенные и подготовленные при запуске; после первой отправки — только file_id.
+    Каждому чату — своя перемешанная колода, без повторов, пока она не кончится."""
+
+    def __init__(self, directory=MEME_DIR, index_path=MEME_INDEX_PATH, max_side=MEME_MAX_SIDE,
+                 quality=MEME_JPEG_QUALITY, max_chats=MEME_MAX_CHATS):
+        self.directory = directory
+        self.index_path = index_path
+        self.max_side = max_side
+        self.quality = quality
+        self.max_chats = max_chats
+        self._lock = threading.Lock()
+        self._memes = []
+        self._decks = OrderedDict()  # chat_id -> (оставшиеся номера, последний показанный)
+        self.hits = {"file_id": 0, "upload": 0}
+        self.reload()
+
+    def reload(self):
+        file_ids = self._load_index()
+        memes = []
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            print(f"Каталог мемов {self.directory} не найден")
+            names = []
+        for name in names:
+            if not name.lower().endswith(EXTENSIONS):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    data = prepare_image(f.read(), self.max_side, self.quality)
+            except (OSError, UnidentifiedImageError, ValueError) as e:
+                print(f"Мем {name} пропущен: {e}")
+                continue
+            key = hashlib.sha256(data).hexdigest()
+            memes.append(Meme(name, key, data, file_ids.get(key)))
+        with self._lock:
+            self._memes = memes
+            self._decks.clear()
+        return len(memes)
+
+    def __len__(self):
+        return len(self._memes)
+
+    def next(self, chat_id):
+        with self._lock:
+            memes = self._memes
+            if not memes:
+                return None
+            deck, last = self._decks.pop(chat_id, ([], None))
+            if not deck:
+                deck = list(range(len(memes)))
+                random.shuffle(deck)
+                # Новая колода не начинается с только что показанного мема
+                if len(deck) > 1 and deck[-1] == last:
+                    deck[0], deck[-1] = deck[-1], deck[0]
+            number = deck.pop()
+            self._decks[chat_id] = (deck, number)
+            if len(self._decks) > self.max_chats:
+                self._decks.popitem(last=False)
+            meme = memes[number]
+            self.hits["file_id" if meme.file_id else "upload"] += 1
+            return meme
+
+    def set_file_id(self, meme, file_id):
+        with self._lock:
+            meme.file_id = file_id
+            self._save_index()
+
+    def forget_file_id(self, meme):
+        with self._lock:
+            meme.file_id = None
+            self._save_index()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memes": len(self._memes),
+                "with_file_id": sum(1 for m in self._memes if m.file_id),
+                "bytes": sum(len(m.data) for m in self._memes),
+                "chats": len(self._decks),
+                "file_id_sends": self.hits["file_id"],
+                "uploads": self.hits["upload"],
+            }
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        if not self.index_path:
+            return
+        index = {m.key: m.file_id for m in self._memes if m.file_id}
+        tmp = f"{self.index_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f, separators=(",", ":"))
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            print(f"Не удалось сохранить file_id мемов: {e}")
@@ -0,0 +1,300 @@
+# metrics.py
+import cProfile
+import functools
+import heapq
+import io
+import itertools
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 — без HTTP, /metrics в формате Prometheus
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "0"))  # 0 — без периодического вывода
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "0"))  # 0 — cProfile выключен
+PROFILE_RATE = float(os.getenv("PROFILE_RATE", "0.1"))  # доля запросов под профайлером
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".profiles")
+
+QUANTILES = (0.5, 0.95, 0.99)
+_SAMPLES = 2048
+OTHER_AIM = "other"
+
+
+def _label_value(value):
+    # Экранирование значения метки по формату Prometheus
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+class Summary:
+    """Длительности одной пары (этап, цель): счётчик, сумма и выборка для квантилей."""
+
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=_SAMPLES)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class Trace:
+    __slots__ = ("kind", "aim", "spans", "started")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.aim = None
+        self.spans = []  # (stage, seconds)
+        self.started = time.perf_counter()
+
+
+class Metrics:
+
+    def __init__(self, profile_top_n=PROFILE_TOP_N, profile_rate=PROFILE_RATE, profile_dir=PROFILE_DIR):
+        self._lock = threading.Lock()
+        self._summaries = {}  # (kind, stage, aim) -> Summary
+        self._gauges = []  # функции, возвращающие {имя: число}
+        self.aims = None  # известные цели; остальные (ответ модели, чужой callback_data) — OTHER_AIM
+        self._local = threading.local()
+        self.profile_top_n = profile_top_n
+        self.profile_rate = profile_rate
+        self.profile_dir = profile_dir
+        # Профайлер один на процесс: второй запрос в это время просто не профилируется
+        self._profiling = threading.Lock()
+        self._slowest = []  # min-heap (seconds, n, label, path)
+        self._counter = itertools.count()
+
+    # ---------------------------------------------------
+    #  Трассы и этапы
+    # ---------------------------------------------------
+
+    def current(self):
+        return getattr(self._local, "trace", None)
+
+    def set_known_aims(self, aims):
+        self.aims = frozenset(aims)
+
+    def set_aim(self, aim):
+        trace = self.current()
+        if trace is not None:
+            # Цель приходит и от GigaChat — без ограничения число рядов в метриках не ограничено
+            trace.aim = aim if self.aims is None or aim in self.aims else OTHER_AIM
+
+    @contextmanager
+    def span(self, stage):
+        trace = self.current()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if trace is not None:
+                trace.spans.append((stage, time.perf_counter() - started))
+
+    def timed(self, fn, stage):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def instrument(self, obj, names, stage):
+        # Обернуть методы объекта (например, отправку сообщений бота) в один этап
+        for name in names:
+            setattr(obj, name, self.timed(getattr(obj, name), stage))
+
+    def traced(self, kind):
+        # Декоратор обработчика: одна трасса на вызов, в конце — запись во все гистограммы
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                outer = self.current()
+                if outer is not None:
+                    # Вложенный обработчик (handle_greeting -> send_welcome) — в трассе внешнего
+                    return fn(*args, **kwargs)
+                trace = self._local.trace = Trace(kind)
+                profiler = self._start_profile()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self._local.trace = None
+                    self._finish(trace, profiler)
+            return wrapper
+        return decorator
+
+    def _finish(self, trace, profiler):
+        elapsed = time.perf_counter() - trace.started
+        aim = trace.aim or "-"
+        with self._lock:
+            for stage, seconds in trace.spans + [("total", elapsed)]:
+                key = (trace.kind, stage, aim)
+                summary = self._summaries.get(key)
+                if summary is None:
+                    summary = self._summaries[key] = Summary()
+                summary.observe(seconds)
+        if profiler is not None:
+            profiler.disable()
+            self._profiling.release()
+            self._keep_profile(profiler, elapsed, f"{trace.kind}-{aim}")
+
+    # ---------------------------------------------------
+    #  Профилирование самых медленных запросов
+    # ---------------------------------------------------
+
+    def _start_profile(self):
+        if self.profile_top_n <= 0 or random.random() >= self.profile_rate:
+            return None
+        if not self._profiling.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _keep_profile(self, profiler, seconds, label):
+        with self._lock:
+            if len(self._slowest) >= self.profile_top_n and seconds <= self._slowest[0][0]:
+                return
+            os.makedirs(self.profile_dir, exist_ok=True)
+            n = next(self._counter)
+            path = os.path.join(self.profile_dir, f"{seconds * 1000:07.0f}ms-{label}-{n}.prof")
+            profiler.dump_stats(path)
+            heapq.heappush(self._slowest, (seconds, n, label, path))
+            if len(self._slowest) > self.profile_top_n:
+                _, _, _, dropped = heapq.heappop(self._slowest)
+                try:
+                    os.remove(dropped)
+                except OSError:
+                    pass
+
+    def slowest(self, lines=15):
+        # Текстовый отчёт по сохранённым профилям, самые медленные сверху
+        with self._lock:
+            items = sorted(self._slowest, reverse=True)
+        out = io.StringIO()
+        for seconds, _, label, path in items:
+            out.write(f"=== {label}: {seconds * 1000:.0f} мс ({path})\n")
+            try:
+                pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(lines)
+            except OSError:
+                out.write("профиль удалён\n")
+        return out.getvalue()
+
+    # ---------------------------------------------------
+    #  Вывод
+    # ---------------------------------------------------
+
+    def register_gauges(self, fn):
+        self._gauges.append(fn)
+
+    def reset(self):
+        with self._lock:
+            self._summaries.clear()
+
+    def gauges(self):
+        # Числовые показатели кэшей, пулов и клиентов из register_gauges
+        result = {}
+        for fn in self._gauges:
+            try:
+                values = fn()
+            except Exception:
+                continue
+            for name, value in values.items():
+                if isinstance(value, (int, float)):
+                    result[_metric_name(name)] = value
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: (s.count, s.total, s.quantiles())
+                for key, s in sorted(self._summaries.items())
+            }
+
+    def prometheus(self):
+        lines = [
+            "# HELP bot_stage_seconds Длительность этапов обработки запроса",
+            "# TYPE bot_stage_seconds summary",
+        ]
+        for (kind, stage, aim), (count, total, quantiles) in self.snapshot().items():
+            labels = f'handler="{_label_value(kind)}",stage="{_label_value(stage)}",aim="{_label_value(aim)}"'
+            for q, value in quantiles.items():
+                lines.append(f'bot_stage_seconds{{{labels},quantile="{q}"}} {value:.6f}')
+            lines.append(f"bot_stage_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"bot_stage_seconds_count{{{labels}}} {count}")
+        for name, value in self.gauges().items():
+            lines.append(f"bot_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        rows = [f"{'handler':<9} {'aim':<18} {'stage':<16} {'n':>6} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}"]
+        for (kind, stage, aim), (count, _, q) in self.snapshot().items():
+            rows.append(
+                f"{kind:<9} {aim:<18} {stage:<16} {count:>6} "
+                f"{q[0.5] * 1000:>9.1f} {q[0.95] * 1000:>9.1f} {q[0.99] * 1000:>9.1f}"
+            )
+        return "\n".join(rows)
+
+    def serve(self, port=METRICS_PORT, host="127.0.0.1"):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, ctype = metrics.prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/profiles":
+                    body, ctype = metrics.slowest(), "text/plain"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", f"{ctype}; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    def log_periodically(self, interval=METRICS_LOG_INTERVAL):
+        def loop():
+            while True:
+                time.sleep(interval)
+                gauges = " ".join(f"{name}={value:g}" for name, value in self.gauges().items())
+                print(f"{self.report()}\n{gauges}", flush=True)
+        thread = threading.Thread(target=loop, name="metrics-log", daemon=True)
+        thread.start()
+        return thread
+
+    def start(self, port=METRICS_PORT, interval=METRICS_LOG_INTERVAL):
+        if port:
+            self.serve(port)
+        if interval > 0:
+            self.log_periodically(interval)
+
+
+metrics = Metrics()
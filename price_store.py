@@ -0,0 +1,110 @@
+# price_store.py
+import numpy as np
+import pandas as pd
+
+from range_index import RangeIndex, range_stats
+
+PRICE_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+
+def _to_days(value):
+    # Дата -> номер дня от 1970-01-01 (int32)
+    return int(pd.Timestamp(value).to_datetime64().astype("datetime64[D]").astype(np.int64))
+
+
+class TickerSeries:
+    __slots__ = ("ticker", "brand", "days", "values")
+
+    def __init__(self, ticker, brand, days, values):
+        self.ticker = ticker
+        self.brand = brand
+        self.days = days      # int32[n], отсортированы по возрастанию
+        self.values = values  # float32[5, n] в порядке PRICE_FIELDS
+
+    def bounds(self, start_day=None, end_day=None):
+        lo = 0 if start_day is None else int(np.searchsorted(self.days, start_day, side="left"))
+        hi = len(self.days) if end_day is None else int(np.searchsorted(self.days, end_day, side="right"))
+        return lo, hi
+
+
+class PriceStore:
+    """Колоночное хранилище stock_data в памяти: по тикеру, отсортировано по дате."""
+
+    def __init__(self, series):
+        self.series = series  # upper(ticker) -> TickerSeries
+        # Индекс для статистики за произвольный период без выборки строк
+        self.ranges = {key: RangeIndex(s.values[PRICE_FIELDS.index("Close")]) for key, s in series.items()}
+
+    @classmethod
+    def from_frame(cls, df):
+        series = {}
+        if df.empty:
+            return cls(series)
+        df = df.assign(_day=pd.to_datetime(df["Date"]).values.astype("datetime64[D]").astype(np.int32))
+        for ticker, group in df.groupby("Ticker", sort=False):
+            group = group.sort_values("_day", kind="stable")
+            values = np.vstack([group[f].to_numpy(dtype=np.float32) for f in PRICE_FIELDS])
+            series[str(ticker).upper()] = TickerSeries(
+                ticker=ticker,
+                brand=group["Brand_Name"].iloc[0],
+                days=np.ascontiguousarray(group["_day"].to_numpy(dtype=np.int32)),
+                values=np.ascontiguousarray(values),
+            )
+        return cls(series)
+
+    def tickers(self):
+        return sorted(s.ticker for s in self.series.values())
+
+    def companies(self):
+        return [(s.ticker, s.brand) for s in self.series.values()]
+
+    def nbytes(self):
+        data = sum(s.days.nbytes + s.values.nbytes for s in self.series.values())
+        return data + sum(r.nbytes() for r in self.ranges.values())
+
+    def _select(self, tickers):
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        if tickers:
+            selected = [self.series[t.upper()] for t in tickers if t and t.upper() in self.series]
+        else:
+            selected = list(self.series.values())
+        return sorted(set(selected), key=lambda item: item.ticker)
+
+    def stats(self, tickers=None, start_date=None, end_date=None):
+        # То же, что compute_stats(query(...)), но по префиксным суммам
+        start_day = _to_days(start_date) if start_date else None
+        end_day = _to_days(end_date) if end_date else None
+        return range_stats(self._select(tickers), self.ranges, start_day, end_day)
+
+    def query(self, tickers=None, start_date=None, end_date=None, columns=None):
+        # Порядок как у ORDER BY "Date", "Ticker": тикеры по алфавиту, сортировка по дате стабильная
+        selected = self._select(tickers)
+
+        start_day = _to_days(start_date) if start_date else None
+        end_day = _to_days(end_date) if end_date else None
+
+        parts_days, parts_values, names, brands = [], [], [], []
+        for s in selected:
+            lo, hi = s.bounds(start_day, end_day)
+            if hi <= lo:
+                continue
+            parts_days.append(s.days[lo:hi])
+            parts_values.append(s.values[:, lo:hi])
+            names.append(np.full(hi - lo, s.ticker, dtype=object))
+            brands.append(np.full(hi - lo, s.brand, dtype=object))
+
+        if not parts_days:
+            return pd.DataFrame(columns=list(columns or ["Date", *PRICE_FIELDS, "Brand_Name", "Ticker"]))
+
+        days = np.concatenate(parts_days)
+        values = np.concatenate(parts_values, axis=1)
+        order = np.argsort(days, kind="stable")
+
+        data = {"Date": days[order].astype("datetime64[D]").astype("datetime64[ns]")}
+        for i, field in enumerate(PRICE_FIELDS):
+            data[field] = values[i, order]
+        data["Brand_Name"] = np.concatenate(brands)[order]
+        data["Ticker"] = np.concatenate(names)[order]
+        df = pd.DataFrame(data)
+        return df if columns is None else df[list(columns)]
@@ -4,7 +4,7 @@ PARSE_PROMPT = """
 Входные данные: запрос пользователя на естественном языке об аналитике цен на акции технологических компаний в 2024 году.
 Выходные данные: JSON с полями:
 {
- "Aim": одно из ["график", "статистика", "анализ", "справка", "неизвестно"],
+ "Aim": одно из ["график", "статистика", "анализ", "сравнение", "топ", "справка", "неизвестно"],
  "ticker": символ тикера или название компании (строка) или null,
  "start_date": "ГГГГ-ММ-ДД" или null,
  "end_date": "ГГГГ-ММ-ДД" или null,
@@ -20,9 +20,11 @@ PARSE_PROMPT = """
    - 2 квартал → "2024-04-01" — "2024-06-30"
    - Первое полугодие → "2024-01-01" — "2024-06-30"
    - Год / за 2024 → "2024-01-01" — "2024-12-31"
-3. В случае неоднозначности выберите разумные значения по умолчанию в пределах 2024 года.
-4. Используйте даты ISO для начальной и конечной даты.
-5. Возвращайте только JSON.
+3. «Сравни», «сопоставь», «корреляция» нескольких компаний → "сравнение".
+   «Какие акции выросли сильнее всего», «лидеры», «аутсайдеры», «рейтинг» → "топ", ticker: null.
+4. В случае неоднозначности выберите разумные значения по умолчанию в пределах 2024 года.
+5. Используйте даты ISO для начальной и конечной даты.
+6. Возвращайте только JSON.
 
 Запрос пользователя:
 \"\"\"{user_message}\"\"\"
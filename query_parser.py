@@ -0,0 +1,277 @@
+# query_parser.py
+import calendar
+import re
+import threading
+
+# Быстрый разбор типовых запросов без обращения к GigaChat.
+# Формат результата совпадает с JSON из PARSE_PROMPT.
+
+YEAR = 2024
+
+MONTHS = {
+    1: "январ", 2: "феврал", 3: "март", 4: "апрел", 6: "июн", 7: "июл",
+    8: "август", 9: "сентябр", 10: "октябр", 11: "ноябр", 12: "декабр",
+}
+MAY_FORMS = {"май", "мая", "мае", "маю"}
+MONTH_NAMES = {
+    1: "январь", 2: "февраль", 3: "март", 4: "апрель", 5: "май", 6: "июнь",
+    7: "июль", 8: "август", 9: "сентябрь", 10: "октябрь", 11: "ноябрь", 12: "декабрь",
+}
+
+ORDINALS = {"1": 1, "2": 2, "3": 3, "4": 4, "i": 1, "ii": 2, "iii": 3, "iv": 4}
+ORDINAL_STEMS = {"перв": 1, "втор": 2, "трет": 3, "четв": 4}
+ORDINAL_SUFFIXES = {"й", "ый", "ой", "ий", "го", "м"}
+
+# «покажи» само по себе означает график, но уступает любой явной цели
+WEAK_AIMS = {"покажи": "график", "показать": "график"}
+AIMS = (
+    ("график", ("график", "динамик", "нарисуй", "чарт")),
+    ("статистика", ("статист", "стата", "цифр", "показател")),
+    ("анализ", ("анализ", "проанализ", "аналитик", "вывод", "оцен")),
+    ("сравнение", ("сравн", "сопостав", "корреляц")),
+    ("топ", ("топ", "лидер", "рейтинг", "аутсайдер", "лучш", "худш", "вырос", "упал", "подорож", "подешев")),
+    ("справка", ("помощ", "справк", "умеешь", "help")),
+)
+
+# Падежные окончания после названия бренда: «эппла», «нвидии», «гуглу», «интелом»
+ALIAS_ENDINGS = ("а", "у", "е", "ом", "и", "ии", "ы", "ю", "ей", "ой")
+
+# Русские названия брендов из stock_data (Brand_Name в нижнем регистре)
+BRAND_ALIASES = {
+    "apple": ("эппл", "эпл", "апл", "эппол"),
+    "microsoft": ("майкрософт", "микрософт", "мелкософт"),
+    "nvidia": ("нвиди", "энвиди"),
+    "google": ("гугл",),
+    "alphabet": ("алфавит", "альфабет"),
+    "meta platforms": ("мета", "фейсбук"),
+    "intel": ("интел",),
+    "amd": ("амд",),
+    "adobe": ("адоби", "адобе"),
+    "cisco": ("циско", "сиско"),
+    "zoom": ("зум",),
+    "sony": ("сони",),
+    "nintendo": ("нинтендо",),
+    "logitech": ("логитек", "логитех"),
+    "spotify": ("спотифай",),
+    "netflix": ("нетфликс",),
+    "amazon": ("амазон",),
+    "tesla": ("тесла", "теслы", "теслу"),
+}
+
+# Слова, которые не мешают считать разбор уверенным
+STOPWORDS = {
+    "за", "и", "по", "с", "со", "в", "во", "на", "до", "от", "мне", "пожалуйста", "плиз",
+    "акции", "акций", "акциям", "компании", "компаний", "компания", "цена", "цены", "цен",
+    "сделай", "сделать", "дай", "дайте", "хочу", "нужна", "нужен", "нужно", "можно", "какая",
+    "какой", "какие", "был", "была", "было", "период", "года", "год", "году", "весь", "всё", "все",
+    "тикер", "тикера", "бумаг", "бумаги", "2024", "г", "сводку", "краткий", "краткую", "посчитай",
+    "кв", "квартал", "квартала", "полугодие", "полугодия", "числа", "й", "ый", "ой", "ий",
+    "акция", "бумага", "сильнее", "больше", "всего", "всех", "самые", "самая", "самый", "самых",
+    "технологических", "технологические", "техно", "среди", "роста", "падения",
+}
+
+_TOKEN_RE = re.compile(r"[a-zа-яё0-9]+(?:\.[a-z]+)?", re.IGNORECASE)
+
+
+def _month_of(token):
+    if token in MAY_FORMS:
+        return 5
+    for month, stem in MONTHS.items():
+        if token.startswith(stem):
+            return month
+    return None
+
+
+def _ordinal_of(token):
+    if token in ORDINALS:
+        return ORDINALS[token]
+    for stem, value in ORDINAL_STEMS.items():
+        if token.startswith(stem):
+            return value
+    return None
+
+
+def _prev_ordinal(tokens, i):
+    # Порядковое число перед словом: «2 квартал», «2-й квартал», «второй квартал»
+    j = i - 1
+    if j >= 0 and tokens[j] in ORDINAL_SUFFIXES:
+        j -= 1
+    if j >= 0 and _ordinal_of(tokens[j]):
+        return _ordinal_of(tokens[j]), j
+    return None, None
+
+
+def _month_end(month):
+    return calendar.monthrange(YEAR, month)[1]
+
+
+class QueryParser:
+    """Словарь тикеров/брендов + шаблоны периодов и целей; при сомнениях возвращает None."""
+
+    def __init__(self, companies):
+        # companies: пары (Ticker, Brand_Name) из stock_data
+        self.tickers = {}
+        self.aliases = {}
+        for ticker, brand in companies:
+            ticker = str(ticker).upper()
+            self.tickers[ticker] = ticker
+            brand = str(brand or "").lower().strip()
+            if not brand:
+                continue
+            names = {brand, brand.split()[0], *BRAND_ALIASES.get(brand, ())}
+            for name in names:
+                if len(name) >= 3:
+                    self.aliases.setdefault(name, ticker)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hits = 0
+
+    def parse(self, message):
+        with self._lock:
+            self.calls += 1
+        result = self._parse(message)
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.calls if self.calls else 0.0,
+            }
+
+    def _parse(self, message):
+        raw_tokens = _TOKEN_RE.findall(message)
+        tokens = [t.lower() for t in raw_tokens]
+        used = [False] * len(tokens)
+
+        aim = None
+        weak_aim = None
+        for i, token in enumerate(tokens):
+            if token in WEAK_AIMS:
+                weak_aim = WEAK_AIMS[token]
+                used[i] = True
+                continue
+            for name, stems in AIMS:
+                if any(token.startswith(stem) for stem in stems):
+                    if aim not in (None, name):
+                        return None  # несколько целей — пусть решает модель
+                    aim = name
+                    used[i] = True
+        aim = aim or weak_aim
+
+        tickers = []
+        for i, (raw, token) in enumerate(zip(raw_tokens, tokens)):
+            if used[i]:
+                continue
+            ticker = self._ticker_of(raw, token)
+            if ticker:
+                used[i] = True
+                if ticker not in tickers:
+                    tickers.append(ticker)
+
+        period = self._period(tokens, used)
+        if period is False:
+            return None
+
+        leftovers = [t for t, u in zip(tokens, used) if not u and t not in STOPWORDS]
+        if aim is None or leftovers or (not tickers and aim not in ("справка", "топ")):
+            return None
+
+        start_date, end_date, label = period or (None, None, None)
+        return {
+            "Aim": aim,
+            "ticker": tickers or None,
+            "start_date": start_date,
+            "end_date": end_date,
+            "period": label,
+        }
+
+    def _ticker_of(self, raw, token):
+        # Тикер — только латиницей заглавными (AAPL) или длиной от 3 символов (aapl)
+        upper = token.upper()
+        if upper in self.tickers and (raw.isupper() or len(token) >= 3):
+            return upper
+        if token in self.aliases:
+            return self.aliases[token]
+        for ending in ALIAS_ENDINGS:
+            alias = token[:-len(ending)]
+            if token.endswith(ending) and len(alias) >= 4 and alias in self.aliases:
+                return self.aliases[alias]
+        return None
+
+    def _period(self, tokens, used):
+        # Возвращает (start, end, label), None — период не указан, False — непонятно
+        found = []
+        n = len(tokens)
+        i = 0
+        while i < n:
+            token = tokens[i]
+            nxt = tokens[i + 1] if i + 1 < n else ""
+
+            if token.startswith("квартал") and _prev_ordinal(tokens, i)[0]:
+                q, first = _prev_ordinal(tokens, i)
+                found.append(("quarter", q, first, i))
+            elif re.fullmatch(r"q[1-4]", token):
+                found.append(("quarter", int(token[1]), i, i))
+            elif token.startswith("полугоди") and _prev_ordinal(tokens, i)[0] in (1, 2):
+                h, first = _prev_ordinal(tokens, i)
+                found.append(("half", h, first, i))
+            elif re.fullmatch(r"h[12]", token):
+                found.append(("half", int(token[1]), i, i))
+            elif token.isdigit() and 1 <= int(token) <= 31 and _month_of(nxt):
+                found.append(("day", (int(token), _month_of(nxt)), i, i + 1))
+                i += 1
+            elif _month_of(token):
+                found.append(("month", _month_of(token), i, i))
+            elif token in ("кв", "квартал") and nxt and _ordinal_of(nxt):
+                found.append(("quarter", _ordinal_of(nxt), i, i + 1))
+                i += 1
+            elif token in ("год", "году", "года", "2024") or (token == "весь" and nxt.startswith("год")):
+                found.append(("year", None, i, i))
+            i += 1
+
+        if not found:
+            return None
+
+        for _, _, first, last in found:
+            for j in range(first, last + 1):
+                used[j] = True
+
+        # «март 2024 года» — год лишь уточняет более узкий период
+        found = [f for f in found if f[0] != "year"] or found[:1]
+
+        if len(found) == 1:
+            kind, value, _, _ = found[0]
+            if kind == "year":
+                return f"{YEAR}-01-01", f"{YEAR}-12-31", str(YEAR)
+            if kind == "month":
+                return f"{YEAR}-{value:02d}-01", f"{YEAR}-{value:02d}-{_month_end(value):02d}", MONTH_NAMES[value]
+            if kind == "quarter":
+                first, last = 3 * value - 2, 3 * value
+                return f"{YEAR}-{first:02d}-01", f"{YEAR}-{last:02d}-{_month_end(last):02d}", f"{value} квартал"
+            if kind == "half":
+                first, last = (1, 6) if value == 1 else (7, 12)
+                label = "первое полугодие" if value == 1 else "второе полугодие"
+                return f"{YEAR}-{first:02d}-01", f"{YEAR}-{last:02d}-{_month_end(last):02d}", label
+            return False  # одна дата без диапазона
+
+        if len(found) == 2 and {found[0][0], found[1][0]} <= {"month", "day"}:
+            start = self._bound(found[0], start=True)
+            end = self._bound(found[1], start=False)
+            if start and end and start <= end:
+                return start, end, f"{start} — {end}"
+        return False
+
+    def _bound(self, item, start):
+        kind, value, _, _ = item
+        if kind == "day":
+            day, month = value
+            if day > _month_end(month):
+                return None
+            return f"{YEAR}-{month:02d}-{day:02d}"
+        day = 1 if start else _month_end(value)
+        return f"{YEAR}-{value:02d}-{day:02d}"
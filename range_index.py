@@ -0,0 +1,107 @@
+# range_index.py
+import numpy as np
+
+
+def _sparse_table(values, op):
+    # table[k][i] = op(values[i:i + 2**k]); запрос любого отрезка — два обращения
+    table = [values]
+    width = 1
+    while width * 2 <= len(values):
+        prev = table[-1]
+        table.append(op(prev[:-width], prev[width:]))
+        width *= 2
+    return table
+
+
+class RangeIndex:
+    """Префиксные суммы и разреженные таблицы по Close одного тикера.
+
+    Статистика за любой отрезок [lo, hi) считается за O(1) и совпадает с compute_stats.
+    """
+
+    __slots__ = ("close", "close_sum", "close_nan", "ret_sum", "ret_sq_sum", "ret_count", "ret_bad",
+                 "min_table", "max_table")
+
+    def __init__(self, close):
+        close = np.asarray(close, dtype=np.float64)
+        self.close = close
+
+        nan = np.isnan(close)
+        self.close_sum = np.concatenate(([0.0], np.cumsum(np.where(nan, 0.0, close))))
+        self.close_nan = np.concatenate(([0], np.cumsum(nan)))
+
+        # returns[k] — доходность дня k к дню k-1; returns[0] не определена
+        returns = np.full(len(close), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns[1:] = close[1:] / close[:-1] - 1
+        valid = ~np.isnan(returns)
+        # Бесконечности (цена 0) отдельно: в суммах они испортили бы все последующие отрезки
+        bad = np.isinf(returns)
+        clean = np.where(valid & ~bad, returns, 0.0)
+        self.ret_sum = np.concatenate(([0.0], np.cumsum(clean)))
+        self.ret_sq_sum = np.concatenate(([0.0], np.cumsum(clean * clean)))
+        self.ret_count = np.concatenate(([0], np.cumsum(valid)))
+        self.ret_bad = np.concatenate(([0], np.cumsum(bad)))
+
+        self.min_table = _sparse_table(close, np.minimum)
+        self.max_table = _sparse_table(close, np.maximum)
+
+    def nbytes(self):
+        arrays = [self.close_sum, self.close_nan, self.ret_sum, self.ret_sq_sum, self.ret_count, self.ret_bad]
+        return sum(a.nbytes for a in arrays) + sum(t.nbytes for t in self.min_table + self.max_table)
+
+    def _range(self, table, lo, hi):
+        k = (hi - lo).bit_length() - 1
+        return table[k][lo], table[k][hi - (1 << k)]
+
+    def stats(self, lo, hi):
+        # (mean, min, max, start, end, volatility) для close[lo:hi], hi > lo
+        n = hi - lo
+        if self.close_nan[hi] - self.close_nan[lo]:
+            mean = np.nan
+        else:
+            mean = (self.close_sum[hi] - self.close_sum[lo]) / n
+        min_close = np.minimum(*self._range(self.min_table, lo, hi))
+        max_close = np.maximum(*self._range(self.max_table, lo, hi))
+
+        # Доходности внутри отрезка — с lo + 1 по hi - 1
+        r_lo = lo + 1
+        count = self.ret_count[hi] - self.ret_count[r_lo] if hi > r_lo else 0
+        if count < 2 or self.ret_bad[hi] - self.ret_bad[r_lo]:
+            volatility = np.nan
+        else:
+            s1 = self.ret_sum[hi] - self.ret_sum[r_lo]
+            s2 = self.ret_sq_sum[hi] - self.ret_sq_sum[r_lo]
+            volatility = np.sqrt(max(s2 - s1 * s1 / count, 0.0) / (count - 1))
+
+        return mean, float(min_close), float(max_close), float(self.close[lo]), float(self.close[hi - 1]), volatility
+
+
+def range_stats(series, ranges, start_day=None, end_day=None):
+    # series: [TickerSeries], ranges: upper(ticker) -> RangeIndex; результат в формате compute_stats
+    results = {}
+    for s in sorted(series, key=lambda item: item.ticker):
+        lo, hi = s.bounds(start_day, end_day)
+        if hi <= lo:
+            continue
+        mean_, min_, max_, start_, end_, vol = ranges[s.ticker.upper()].stats(lo, hi)
+        stats = {
+            "ticker": s.ticker,
+            "mean_close": float(mean_),
+            "min_close": min_,
+            "max_close": max_,
+            "start_price": start_,
+            "end_price": end_,
+        }
+
+        stats["change_abs"] = stats["end_price"] - stats["start_price"]
+        stats["change_pct"] = (
+            stats["change_abs"] / stats["start_price"] * 100
+            if stats["start_price"] != 0
+            else None
+        )
+
+        stats["volatility"] = float(vol)
+
+        results[s.ticker] = stats
+    return results or None
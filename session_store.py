@@ -0,0 +1,171 @@
+# session_store.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+from analysis import create_db_engine
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # memory | sql
+SESSION_DB_URL = os.getenv("SESSION_DB_URL", "")  # пусто — та же БД, что у бота
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_TABLE = "bot_sessions"
+
+# Поля контекста чата; хранятся списком без имён
+SESSION_FIELDS = ("tickers", "start_date", "end_date")
+
+
+def pack(ctx):
+    return json.dumps([ctx.get(f) for f in SESSION_FIELDS], ensure_ascii=False, separators=(",", ":"))
+
+
+def unpack(data):
+    values = json.loads(data)
+    return dict(zip(SESSION_FIELDS, values))
+
+
+class MemorySessionStore:
+    """Контексты чатов в памяти процесса: LRU с ограничением числа записей и TTL."""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()  # chat_id -> (packed ctx, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chat_id):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(chat_id)
+            if item is None or item[1] <= now:
+                if item is not None:
+                    del self._items[chat_id]
+                self.misses += 1
+                return None
+            self._items.move_to_end(chat_id)
+            self.hits += 1
+            return unpack(item[0])
+
+    def set(self, chat_id, ctx):
+        with self._lock:
+            self._items.pop(chat_id, None)
+            self._items[chat_id] = (pack(ctx), time.monotonic() + self.ttl)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._items.pop(chat_id, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class SQLSessionStore:
+    """Контексты чатов в таблице bot_sessions (SQLite или Postgres): переживают рестарт
+    и общие для всех процессов бота."""
+
+    def __init__(self, engine, table=SESSION_TABLE, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES):
+        self.engine = engine
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._sets = 0
+        self._lock = threading.Lock()
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " chat_id BIGINT PRIMARY KEY, data TEXT NOT NULL, updated_at DOUBLE PRECISION NOT NULL)"
+            ))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_updated_at ON {table} (updated_at)"))
+
+    def get(self, chat_id):
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text(f"SELECT data FROM {self.table} WHERE chat_id = :chat_id AND updated_at > :since"),
+                {"chat_id": chat_id, "since": time.time() - self.ttl},
+            ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return unpack(row[0])
+
+    def set(self, chat_id, ctx):
+        now = time.time()
+        with self.engine.begin() as conn:
+            # ON CONFLICT поддерживают и Postgres, и SQLite >= 3.24
+            conn.execute(
+                text(
+                    f"INSERT INTO {self.table} (chat_id, data, updated_at) VALUES (:chat_id, :data, :now) "
+                    f"ON CONFLICT (chat_id) DO UPDATE SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at"
+                ),
+                {"chat_id": chat_id, "data": pack(ctx), "now": now},
+            )
+        with self._lock:
+            self._sets += 1
+            trim = self._sets % 100 == 0
+        if trim:
+            self._trim(now)
+
+    def _trim(self, now):
+        # Устаревшие записи и всё сверх max_entries, начиная с самых давних
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.table} WHERE updated_at < :since"), {"since": now - self.ttl})
+            row = conn.execute(
+                text(f"SELECT updated_at FROM {self.table} ORDER BY updated_at DESC LIMIT 1 OFFSET :n"),
+                {"n": self.max_entries},
+            ).fetchone()
+            if row is not None:
+                conn.execute(text(f"DELETE FROM {self.table} WHERE updated_at <= :cutoff"), {"cutoff": row[0]})
+
+    def delete(self, chat_id):
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.table} WHERE chat_id = :chat_id"), {"chat_id": chat_id})
+
+    def stats(self):
+        with self.engine.connect() as conn:
+            entries = conn.execute(text(f"SELECT COUNT(*) FROM {self.table}")).scalar()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "sql",
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def create_session_store(engine=None, backend=None):
+    backend = backend or SESSION_BACKEND
+    if backend != "sql":
+        return MemorySessionStore()
+    try:
+        if SESSION_DB_URL:
+            engine = create_db_engine(SESSION_DB_URL)
+        return SQLSessionStore(engine)
+    except Exception as e:
+        # Контексты в памяти лучше, чем никаких
+        print(f"Не удалось подключить хранилище сессий, храним в памяти: {e}")
+        return MemorySessionStore()
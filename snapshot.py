@@ -0,0 +1,190 @@
+# snapshot.py
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+# pyarrow нужен только для снимка; без него бот работает с Postgres или PriceStore
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = ds = pq = None
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshot/stock_data")
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "arrow")  # arrow (IPC, memory-map) | parquet
+
+SNAPSHOT_COLUMNS = ("Date", "Ticker", "Brand_Name", "Open", "High", "Low", "Close", "Volume")
+
+_FILES = {"arrow": "part-0.arrow", "parquet": "part-0.parquet"}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Для снимка stock_data нужен пакет pyarrow")
+
+
+def _partition_dir(path, ticker):
+    return os.path.join(path, f"Ticker={ticker}")
+
+
+def write_ticker(path, ticker, df, fmt=SNAPSHOT_FORMAT):
+    # Одна партиция: все дни тикера, отсортированные по дате
+    _require_pyarrow()
+    df = df.sort_values("Date", kind="stable")
+    table = pa.Table.from_pandas(
+        df.assign(Date=pd.to_datetime(df["Date"]))[[c for c in SNAPSHOT_COLUMNS if c != "Ticker"]],
+        preserve_index=False,
+    )
+    directory = _partition_dir(path, ticker)
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, _FILES[fmt])
+    if fmt == "arrow":
+        with pa.OSFile(target, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, target, row_group_size=64 * 1024)
+
+
+def _versions(path):
+    parent, name = os.path.split(os.path.abspath(path))
+    prefix = f"{name}.v"
+    return sorted(
+        os.path.join(parent, entry) for entry in os.listdir(parent)
+        if entry.startswith(prefix) and entry[len(prefix):].isdigit()
+    )
+
+
+def write_snapshot(frames, path=SNAPSHOT_DIR, fmt=SNAPSHOT_FORMAT, keep=2):
+    # frames: итератор (ticker, DataFrame). Каждый снимок — свой каталог path.v<время>,
+    # а path — символическая ссылка на текущий; os.replace подменяет её атомарно,
+    # так что читатель всегда видит либо старый, либо новый снимок целиком
+    _require_pyarrow()
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    version = f"{os.path.abspath(path)}.v{time.time_ns()}"
+    tmp = f"{version}.tmp"
+    os.makedirs(tmp)
+    count = 0
+    try:
+        for ticker, df in frames:
+            write_ticker(tmp, ticker, df, fmt)
+            count += 1
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    os.rename(tmp, version)
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Каталог от прежней версии загрузчика: один раз переносим его под версию
+        os.rename(path, f"{os.path.abspath(path)}.v0")
+    link = f"{version}.link"
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, path)
+
+    # Предыдущий снимок оставляем: его может как раз открывать другой процесс бота
+    for old in _versions(path)[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    return count
+
+
+class SnapshotStore:
+    """Снимок stock_data по партициям Ticker=...; тот же интерфейс query, что у PriceStore."""
+
+    def __init__(self, path=SNAPSHOT_DIR, fmt=SNAPSHOT_FORMAT, attempts=3):
+        _require_pyarrow()
+        self.path = path
+        self.fmt = fmt
+        for attempt in range(attempts):
+            try:
+                self._open()
+                return
+            except FileNotFoundError:
+                # Снимок подменили и удалили старый, пока мы его открывали — берём новый
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.1)
+
+    def _open(self):
+        # Ссылку разыменовываем один раз: все партиции читаем из одной версии снимка
+        root = self.root = os.path.realpath(self.path)
+        self.tables = {}   # upper(ticker) -> (ticker, pa.Table или None для parquet, путь к файлу)
+        for name in sorted(os.listdir(root)):
+            if not name.startswith("Ticker="):
+                continue
+            ticker = name[len("Ticker="):]
+            file = os.path.join(root, name, _FILES[self.fmt])
+            if self.fmt == "arrow":
+                # memory_map: страницы файла общие для всех процессов бота
+                table = pa.ipc.open_file(pa.memory_map(file, "r")).read_all()
+            else:
+                table = None
+            self.tables[ticker.upper()] = (ticker, table, file)
+        if self.fmt == "parquet":
+            # Тип ключа задаём явно: иначе тикеры из цифр прочитаются как int
+            partitioning = ds.partitioning(pa.schema([("Ticker", pa.string())]), flavor="hive")
+            self.dataset = ds.dataset(root, format="parquet", partitioning=partitioning)
+
+    def companies(self):
+        result = []
+        for ticker, table, file in self.tables.values():
+            if table is None:
+                table = pq.read_table(file, columns=["Brand_Name"])
+            brand = table.column("Brand_Name")[0].as_py() if table.num_rows else None
+            result.append((ticker, brand))
+        return result
+
+    def tickers(self):
+        return sorted(t for t, _, _ in self.tables.values())
+
+    def _select(self, tickers):
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        if not tickers:
+            return sorted(self.tables.values())
+        keys = {t.upper() for t in tickers if t}
+        return sorted(self.tables[k] for k in keys if k in self.tables)
+
+    def query(self, tickers=None, start_date=None, end_date=None, columns=SNAPSHOT_COLUMNS):
+        selected = self._select(tickers)
+        if not selected:
+            return pd.DataFrame(columns=list(columns))
+        if self.fmt == "parquet":
+            return self._query_parquet([t for t, _, _ in selected], start_date, end_date, columns)
+
+        start = np.datetime64(pd.Timestamp(start_date), "ns") if start_date else None
+        end = np.datetime64(pd.Timestamp(end_date), "ns") if end_date else None
+        parts = []
+        for ticker, table, _ in selected:
+            # Даты в партиции отсортированы — границы ищем бинарным поиском
+            dates = table.column("Date").to_numpy()
+            lo = 0 if start is None else int(np.searchsorted(dates, start, side="left"))
+            hi = len(dates) if end is None else int(np.searchsorted(dates, end, side="right"))
+            if hi <= lo:
+                continue
+            part = table.slice(lo, hi - lo)
+            part = part.append_column("Ticker", pa.array([ticker] * part.num_rows, pa.string()))
+            parts.append(part.select([c for c in columns]))
+        if not parts:
+            return pd.DataFrame(columns=list(columns))
+        df = pa.concat_tables(parts).to_pandas()
+        # Партиции уже идут по тикеру, стабильная сортировка по дате даёт ORDER BY "Date", "Ticker"
+        if "Date" in df.columns:
+            df = df.sort_values("Date", kind="stable").reset_index(drop=True)
+        return df
+
+    def _query_parquet(self, tickers, start_date, end_date, columns):
+        # Фильтр по Ticker отсекает партиции, по Date — row group'ы по статистике
+        expr = ds.field("Ticker").isin(tickers)
+        if start_date:
+            expr &= ds.field("Date") >= pa.scalar(pd.Timestamp(start_date), pa.timestamp("ns"))
+        if end_date:
+            expr &= ds.field("Date") <= pa.scalar(pd.Timestamp(end_date), pa.timestamp("ns"))
+        table = self.dataset.to_table(columns=list(columns), filter=expr)
+        df = table.to_pandas()
+        if "Ticker" in df.columns:
+            df["Ticker"] = df["Ticker"].astype(str)
+        return df.sort_values([c for c in ("Date", "Ticker") if c in df.columns], kind="stable").reset_index(drop=True)
@@ -0,0 +1,135 @@
+# summaries.py
+import numpy as np
+import pandas as pd
+
+from query_parser import MONTH_NAMES
+
+SUMMARY_TABLE = "stock_summary"
+
+SUMMARY_COLUMNS = (
+    "period", "period_start", "period_end", "Ticker", "Brand_Name",
+    "start_close", "end_close", "change_pct", "volatility", "max_drawdown_pct", "rank",
+)
+
+SUMMARY_DDL = '''
+CREATE TABLE {table} (
+    "period" VARCHAR(16) NOT NULL,
+    "period_start" DATE NOT NULL,
+    "period_end" DATE NOT NULL,
+    "Ticker" VARCHAR(50) NOT NULL,
+    "Brand_Name" VARCHAR(255),
+    "start_close" FLOAT,
+    "end_close" FLOAT,
+    "change_pct" FLOAT,
+    "volatility" FLOAT,
+    "max_drawdown_pct" FLOAT,
+    "rank" INTEGER NOT NULL
+)
+'''
+
+
+def standard_periods(years):
+    # Все периоды, которые можно назвать в запросе: месяц, квартал, полугодие, год
+    periods = []
+    for year in sorted(set(int(y) for y in years)):
+        for month in range(1, 13):
+            p = pd.Period(year=year, month=month, freq="M")
+            periods.append((f"{year}-{month:02d}", p.start_time.date(), p.end_time.date()))
+        for quarter in range(1, 5):
+            p = pd.Period(year=year, quarter=quarter, freq="Q")
+            periods.append((f"{year}-Q{quarter}", p.start_time.date(), p.end_time.date()))
+        periods.append((f"{year}-H1", pd.Timestamp(year, 1, 1).date(), pd.Timestamp(year, 6, 30).date()))
+        periods.append((f"{year}-H2", pd.Timestamp(year, 7, 1).date(), pd.Timestamp(year, 12, 31).date()))
+        periods.append((str(year), pd.Timestamp(year, 1, 1).date(), pd.Timestamp(year, 12, 31).date()))
+    return periods
+
+
+def period_key(start_date, end_date):
+    # Ключ стандартного периода или None, если даты его не образуют
+    if not start_date or not end_date:
+        return None
+    start = pd.Timestamp(start_date).date()
+    end = pd.Timestamp(end_date).date()
+    for key, p_start, p_end in standard_periods({start.year}):
+        if (p_start, p_end) == (start, end):
+            return key
+    return None
+
+
+def period_label(key):
+    # Подпись для пользователя в том же виде, что у разбора запросов: «март», «2 квартал»
+    if not key:
+        return None
+    year, _, part = key.partition("-")
+    if not part:
+        return f"{year} год"
+    if part.startswith("Q"):
+        return f"{part[1]} квартал"
+    if part.startswith("H"):
+        return "первое полугодие" if part == "H1" else "второе полугодие"
+    return MONTH_NAMES[int(part)]
+
+
+def summarize(df: pd.DataFrame):
+    # Сводка по тикерам за весь переданный кадр; rank 1 — наибольший рост
+    if df.empty:
+        return pd.DataFrame(columns=[c for c in SUMMARY_COLUMNS if not c.startswith("period")])
+
+    df = df.sort_values(["Ticker", "Date"], kind="stable")
+    groups = df.groupby("Ticker", sort=False)
+    close = df["Close"]
+    returns = groups["Close"].pct_change(fill_method=None)
+    drawdown = close / groups["Close"].cummax() - 1
+
+    summary = pd.DataFrame({
+        "Brand_Name": groups["Brand_Name"].first(),
+        "start_close": groups["Close"].first(),
+        "end_close": groups["Close"].last(),
+        "volatility": returns.groupby(df["Ticker"], sort=False).std(),
+        "max_drawdown_pct": drawdown.groupby(df["Ticker"], sort=False).min() * 100,
+    })
+    with np.errstate(divide="ignore", invalid="ignore"):
+        summary["change_pct"] = (summary["end_close"] / summary["start_close"] - 1) * 100
+    summary = summary.sort_values("change_pct", ascending=False, na_position="last", kind="stable")
+    summary["rank"] = np.arange(1, len(summary) + 1)
+    summary = summary.rename_axis("Ticker").reset_index()
+    return summary[[c for c in SUMMARY_COLUMNS if not c.startswith("period")]]
+
+
+def summarize_periods(df: pd.DataFrame):
+    # Все стандартные периоды по годам, которые есть в данных
+    df = df.assign(Date=pd.to_datetime(df["Date"]))
+    frames = []
+    for key, start, end in standard_periods(df["Date"].dt.year.unique()):
+        part = df[(df["Date"] >= pd.Timestamp(start)) & (df["Date"] < pd.Timestamp(end) + pd.Timedelta(days=1))]
+        if part.empty:
+            continue
+        summary = summarize(part)
+        summary.insert(0, "period_end", end)
+        summary.insert(0, "period_start", start)
+        summary.insert(0, "period", key)
+        frames.append(summary)
+    if not frames:
+        return pd.DataFrame(columns=list(SUMMARY_COLUMNS))
+    return pd.concat(frames, ignore_index=True)[list(SUMMARY_COLUMNS)]
+
+
+def format_leaderboard(summary, label, size=5):
+    if summary is None or summary.empty:
+        return "Нет данных для рейтинга."
+
+    def line(row):
+        change = "—" if pd.isna(row.change_pct) else f"{row.change_pct:+.2f}%"
+        drawdown = "—" if pd.isna(row.max_drawdown_pct) else f"{row.max_drawdown_pct:.2f}%"
+        return (f"{row.Ticker} ({row.Brand_Name}):  {change}, "
+                f"цена {row.start_close:.2f} → {row.end_close:.2f}, просадка {drawdown}")
+
+    summary = summary.sort_values("rank")
+    mes = [f"Лидеры роста за {label}:\n"]
+    mes += [f"{i}. {line(row)}" for i, row in enumerate(summary.head(size).itertuples(), 1)]
+    rest = summary.iloc[size:]
+    if not rest.empty:
+        mes.append("\nАутсайдеры:\n")
+        worst = rest.tail(size).iloc[::-1]
+        mes += [f"{i}. {line(row)}" for i, row in enumerate(worst.itertuples(), 1)]
+    return "\n".join(mes)
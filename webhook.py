@@ -0,0 +1,238 @@
+# webhook.py
+# Приём обновлений Telegram через webhook вместо long polling.
+# Запуск: WEBHOOK_URL=https://<хост> python webhook.py
+import asyncio
+import json
+import os
+import time
+import traceback
+from collections import deque
+
+import telebot
+
+from dispatcher import _percentile
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", "8443")))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # публичный адрес, без пути
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # X-Telegram-Bot-Api-Secret-Token
+# Одновременных соединений от Telegram (1–100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Принятых, но ещё не переданных обработчикам обновлений; при заполнении ответ задерживается
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "1000"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_BATCH_DELAY = float(os.getenv("WEBHOOK_BATCH_DELAY", "0.005"))
+# Столько ждём места в очереди; дальше 503, и Telegram повторит доставку сам
+WEBHOOK_ACK_TIMEOUT = float(os.getenv("WEBHOOK_ACK_TIMEOUT", "5"))
+
+_MAX_BODY = 1024 * 1024
+_SAMPLES = 1000
+_RECENT_IDS = 5000
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class WebhookServer:
+    """HTTP-сервер на asyncio: подтверждает обновления сразу после постановки в очередь,
+    а в обработчики передаёт их пачками через bot.process_new_updates."""
+
+    def __init__(self, bot, dispatcher=None, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+                 max_in_flight=WEBHOOK_MAX_IN_FLIGHT, batch_size=WEBHOOK_BATCH_SIZE,
+                 batch_delay=WEBHOOK_BATCH_DELAY, ack_timeout=WEBHOOK_ACK_TIMEOUT):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.path = path
+        self.secret = secret
+        self.max_in_flight = max_in_flight
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.ack_timeout = ack_timeout
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        # Telegram повторяет доставку, если не дождался ответа; дубли отбрасываем
+        self._recent = deque(maxlen=_RECENT_IDS)
+        self._recent_set = set()
+        self.received = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.processed = 0
+        self.batches = 0
+        self._ack = deque(maxlen=_SAMPLES)
+
+    # ---------------------------------------------------
+    #  Очередь и пачки
+    # ---------------------------------------------------
+
+    def _seen(self, update_id):
+        if update_id in self._recent_set:
+            return True
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_set.discard(self._recent[0])
+        self._recent.append(update_id)
+        self._recent_set.add(update_id)
+        return False
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # process_new_updates раскладывает обновления по обработчикам; сами обработчики
+            # выполняет ChatDispatcher, а его backpressure блокирует только этот поток
+            try:
+                await loop.run_in_executor(None, self.bot.process_new_updates, batch)
+            except Exception:
+                traceback.print_exc()
+            self.processed += len(batch)
+            self.batches += 1
+            for _ in batch:
+                self._queue.task_done()
+
+    async def enqueue(self, update):
+        # True — обновление принято (или это дубль), False — очередь так и не освободилась
+        if self._seen(update.update_id):
+            self.duplicates += 1
+            return True
+        try:
+            await asyncio.wait_for(self._queue.put(update), self.ack_timeout)
+        except asyncio.TimeoutError:
+            # Забываем id целиком: Telegram повторит доставку, и её надо принять.
+            # Если оставить его в очереди, потом он вытеснит из множества уже принятую копию
+            self._recent_set.discard(update.update_id)
+            try:
+                self._recent.remove(update.update_id)
+            except ValueError:
+                pass
+            self.rejected += 1
+            return False
+        self.received += 1
+        return True
+
+    # ---------------------------------------------------
+    #  HTTP
+    # ---------------------------------------------------
+
+    async def _handle_request(self, method, path, headers, body):
+        if method == "GET" and path == "/healthz":
+            return 200, json.dumps(self.stats()).encode()
+        if path != self.path:
+            return 404, b""
+        if method != "POST":
+            return 405, b""
+        if self.secret and headers.get("x-telegram-bot-api-secret-token") != self.secret:
+            return 403, b""
+        try:
+            update = telebot.types.Update.de_json(body.decode("utf-8"))
+        except Exception:
+            return 400, b""
+        started = time.perf_counter()
+        accepted = await self.enqueue(update)
+        self._ack.append(time.perf_counter() - started)
+        return (200, b"") if accepted else (503, b"")
+
+    async def _handle_connection(self, reader, writer):
+        # HTTP/1.1 с keep-alive: Telegram держит соединения и шлёт по одному обновлению в запросе
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                if length > _MAX_BODY:
+                    status, payload = 413, b""
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self._handle_request(method, path.split("?", 1)[0], headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and status != 413
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+        self._queue = asyncio.Queue(maxsize=self.max_in_flight)
+        self._batcher = asyncio.create_task(self._run_batches())
+        self._server = await asyncio.start_server(self._handle_connection, host, port, backlog=1024)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+        await self.start(host, port)
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._queue is not None:
+            await self._queue.join()
+        if self._batcher is not None:
+            self._batcher.cancel()
+
+    def stats(self):
+        ack = list(self._ack)
+        stats = {
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "batches": self.batches,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "ack_p50": _percentile(ack, 0.5),
+            "ack_p95": _percentile(ack, 0.95),
+        }
+        if self.dispatcher is not None:
+            stats["dispatcher"] = self.dispatcher.stats()
+        return stats
+
+
+def run_webhook(bot, dispatcher=None, url=WEBHOOK_URL, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+                host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+    if not url:
+        raise RuntimeError("Для режима webhook нужен WEBHOOK_URL")
+    bot.remove_webhook()
+    bot.set_webhook(
+        url=url.rstrip("/") + path,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        secret_token=secret or None,
+    )
+    server = WebhookServer(bot, dispatcher, path=path, secret=secret)
+    print(f"Webhook: слушаем {host}:{port}{path}")
+    asyncio.run(server.serve_forever(host, port))
+
+
+if __name__ == "__main__":
+    from DailyPriceBot import bot, dispatcher, engine, on_data_changed
+    from change_listener import listen_for_changes
+    from metrics import metrics
+
+    metrics.start()
+    listen_for_changes(engine, on_data_changed)
+    run_webhook(bot, dispatcher)